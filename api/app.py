@@ -1,23 +1,48 @@
-from fastapi import FastAPI, Request, Form, HTTPException, Depends
+from fastapi import FastAPI, Request, Form, HTTPException, Depends, Query
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
-from typing import List, Optional
-from dotenv import load_dotenv
-import uvicorn
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from typing import Any, Dict, List, Optional
 import logging
-import requests
+import httpx
+import asyncio
 import os
+import sys
+import re
+import json
+import time
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware import Middleware
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import Match
 
-from .perplexity_service import PerplexityService, get_perplexity_service, PerplexityAPIError, ParsingError
+from .config import load_config
+from .perplexity_service import get_perplexity_service, PerplexityAPIError, ParsingError
+from .cache import get_recommendation_cache
+from .stream_parser import SectionedEvents
+from .http_client import start_http_client, close_http_client, http_client_stats
+from .batch import BATCH_MAX_PROFILES, BatchRequest, run_batch
+from .rate_limit import (
+    RateLimitedError,
+    client_over_limit,
+    client_retry_after,
+    get_batch_rate_limiter,
+    get_client_rate_limiter,
+    rate_limit_stats,
+)
+from .jobs import DONE, FAILED, JobQueue, QueueFullError, RecommendationJobRequest, get_job_backend
+from .static_assets import REVALIDATE_CACHE_CONTROL, StaticAssets
+from .page_cache import PageCache
+from .zip_index import check_zip_index
+from .templating import create_environment
+from . import metrics
+from .logging_config import configure_logging, log_event
+from . import warm_cache
 
-load_dotenv()
+# .env 로드 (프로세스당 한 번)
+load_config()
 
-# Logging configuration
-logging.basicConfig(level=logging.INFO)
+# Logging configuration (LOG_FORMAT, LOG_QUEUE, LOG_SAMPLE_RATES)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Vercel Analytics 미들웨어
@@ -28,6 +53,104 @@ class VercelAnalyticsMiddleware(BaseHTTPMiddleware):
             response.headers["x-vercel-analytics"] = "true"
         return response
 
+# 라우트별 지연 시간 / 처리 중 요청 수 측정
+class MetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        start = time.perf_counter()
+        metrics.HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            response = await call_next(request)
+        except Exception:
+            metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
+            self._observe(request, 500, start)
+            raise
+
+        # 스트리밍 응답은 본문 전송이 끝난 시점까지 측정
+        body_iterator = response.body_iterator
+
+        async def observed_body():
+            try:
+                async for chunk in body_iterator:
+                    yield chunk
+            finally:
+                metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
+                self._observe(request, response.status_code, start)
+
+        response.body_iterator = observed_body()
+        return response
+
+    @staticmethod
+    def _route_path(request) -> str:
+        """Path template of the route or mount that serves the request, or "unmatched" """
+        route = request.scope.get("route")
+        if route is None:
+            # 마운트(/static)로 처리됐거나 미들웨어가 라우트 전에 응답한 경우 (예: 429)
+            # 마운트가 바꾼 root_path를 되돌려 앱 기준 경로로 다시 매칭
+            scope = dict(request.scope, root_path=request.scope.get("app_root_path", request.scope.get("root_path", "")))
+            route = next(
+                (candidate for candidate in request.app.router.routes
+                 if candidate.matches(scope)[0] == Match.FULL),
+                None
+            )
+        return getattr(route, "path", "unmatched")
+
+    @classmethod
+    def _observe(cls, request, status_code, start):
+        # 경로 템플릿으로 집계해 라벨 수가 늘어나지 않도록 함
+        route_path = cls._route_path(request)
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - start, method=request.method, route=route_path
+        )
+        metrics.HTTP_REQUESTS.inc(method=request.method, route=route_path, status=str(status_code))
+
+# 업스트림 호출을 일으킬 수 있는 경로만 클라이언트별로 제한
+RATE_LIMITED_ROUTES = {
+    ("POST", "/recommend"),
+    ("POST", "/recommend/stream"),
+    ("GET", "/api/pharmacies"),
+    ("POST", "/api/recommendations/batch"),
+    ("POST", "/api/jobs"),
+}
+# 한도를 넘어도 캐시로 응답할 수 있는 경로
+CACHE_SERVABLE_ROUTES = {"/recommend", "/recommend/stream", "/api/pharmacies"}
+# 프록시 뒤(예: Vercel)에서만 켜야 함 - 직접 노출된 앱에서는 헤더를 클라이언트가 위조할 수 있음
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "False").lower() == "true"
+# X-Forwarded-For에 주소를 덧붙이는 신뢰할 수 있는 프록시 수 (Vercel은 1)
+TRUSTED_PROXY_HOPS = max(1, int(os.getenv("TRUSTED_PROXY_HOPS", "1")))
+
+def client_id(request: Request) -> str:
+    """
+    Client address for per-client limits. With TRUST_PROXY_HEADERS the
+    address our own proxies appended to X-Forwarded-For is used: entries
+    to the left of it are supplied by the client and may be forged.
+    """
+    if TRUST_PROXY_HEADERS:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        limiter = get_client_rate_limiter()
+        if limiter is None or (request.method, request.url.path) not in RATE_LIMITED_ROUTES:
+            return await call_next(request)
+
+        retry_after = limiter.try_acquire(client_id(request))
+        if not retry_after:
+            return await call_next(request)
+        if request.url.path not in CACHE_SERVABLE_ROUTES:
+            error = RateLimitedError("client", retry_after)
+            metrics.RATE_LIMITED.inc(limiter="client", outcome="rejected")
+            return JSONResponse(
+                status_code=429,
+                content={"error": "Too many requests; please retry later"},
+                headers={"Retry-After": error.retry_after_header}
+            )
+        # 캐시 적중은 그대로 응답하고, 새 업스트림 호출만 서비스 계층에서 거절
+        with client_over_limit(retry_after):
+            return await call_next(request)
+
 # Initialize FastAPI app
 app = FastAPI(title="Meditrek")
 
@@ -40,30 +163,206 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.add_middleware(VercelAnalyticsMiddleware)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Set up static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+# 정적 파일은 메모리에서 지문(fingerprint) URL + 사전 압축본으로 제공
+static_assets = StaticAssets("static")
+app.mount("/static", static_assets, name="static")
+templates = Jinja2Templates(env=create_environment())
+# 스트리밍 결과 페이지용 (async generator를 템플릿에서 직접 순회)
+stream_templates = create_environment(is_async=True)
+for environment in (templates.env, stream_templates):
+    environment.globals["asset_url"] = static_assets.url
+# 컨텍스트가 고정된 페이지(/, /form)는 한 번만 렌더링
+page_cache = PageCache(templates.env)
+
+STREAM_RESULTS = os.getenv("STREAM_RESULTS", "False").lower() == "true"
+# 폼 제출을 백그라운드 작업으로 처리하고 결과 페이지에서 완료를 기다림
+JOB_MODE = os.getenv("JOB_MODE", "False").lower() == "true"
+# SSE 연결이 로드밸런서 유휴 타임아웃에 끊기지 않도록 주기적으로 상태 재전송
+JOB_EVENTS_KEEPALIVE = float(os.getenv("JOB_EVENTS_KEEPALIVE", "15"))
+
+metrics.register_cache("recommendations", lambda: get_recommendation_cache().stats())
+metrics.register_cache("geocode", lambda: pharmacy_cache_stats().get("geocode", {}))
+metrics.register_cache("pharmacies", lambda: pharmacy_cache_stats().get("pharmacies", {}))
+metrics.registry.register_collector(
+    "meditrek_coalesced_requests_total", "counter", "Recommendation requests that joined an in-flight upstream call",
+    lambda: [({}, get_perplexity_service().inflight_stats()["coalesced"])]
+)
+metrics.registry.register_collector(
+    "meditrek_semantic_cache_matches_total", "counter", "Cache misses served from a near-duplicate symptom profile",
+    lambda: [({}, stats["matches"])] if (stats := get_perplexity_service().similarity_stats()) else []
+)
+metrics.registry.register_collector(
+    "meditrek_job_queue_depth", "gauge", "Background jobs waiting for a worker",
+    lambda: [({}, job_queue.backend.depth())]
+)
+metrics.registry.register_collector(
+    "meditrek_jobs_running", "gauge", "Background jobs currently running",
+    lambda: [({}, job_queue.running)]
+)
+metrics.registry.register_collector(
+    "meditrek_rate_limit_saturation", "gauge", "Share of an upstream rate limiter's burst currently used",
+    lambda: [
+        ({"limiter": upstream}, 1 - stats["available"] / stats["burst"])
+        for upstream, stats in rate_limit_stats().items() if upstream != "client" and stats
+    ]
+)
+metrics.registry.register_collector(
+    "meditrek_rate_limit_clients", "gauge", "Clients tracked by the per-client rate limiter",
+    lambda: [({}, stats["clients"])] if (stats := rate_limit_stats()["client"]) else []
+)
+metrics.registry.register_collector(
+    "meditrek_cache_warmup_coverage", "gauge", "Share of logged requests cached after the last warm-up",
+    lambda: [({}, report["coverage"])] if (report := warm_cache.last_report()) else []
+)
+metrics.registry.register_collector(
+    "meditrek_cache_warmup_duration_seconds", "gauge", "Duration of the last cache warm-up",
+    lambda: [({}, report["duration_seconds"])] if (report := warm_cache.last_report()) else []
+)
+metrics.registry.register_collector(
+    "meditrek_circuit_breaker_open", "gauge", "1 while the upstream circuit breaker is not closed",
+    lambda: [({"upstream": "perplexity"}, int(get_perplexity_service().resilience_stats()["breaker"]["state"] != "closed"))]
+)
+
+CACHE_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "60"))
 
-# 서비스 의존성 설정
-app.dependency_overrides[get_perplexity_service] = lambda: PerplexityService()
+async def _sweep_cache_periodically():
+    """Drop expired cache entries in the background"""
+    cache = get_recommendation_cache()
+    while True:
+        await asyncio.sleep(CACHE_SWEEP_INTERVAL)
+        # SQLite 쓰기 잠금을 기다릴 수 있으므로 이벤트 루프 밖에서 실행
+        removed = await asyncio.to_thread(cache.sweep)
+        if removed:
+            logger.info(f"Cache sweep removed {removed} expired entries")
 
+@app.on_event("startup")
+async def start_cache_sweeper():
+    app.state.cache_sweeper = asyncio.create_task(_sweep_cache_periodically())
+
+# 과거 요청 로그로 캐시 미리 채우기 (시작 시, 또는 주기적으로)
+WARM_CACHE_LOG = os.getenv("WARM_CACHE_LOG")
+WARM_CACHE_INTERVAL = float(os.getenv("WARM_CACHE_INTERVAL", "0"))
+
+@app.on_event("startup")
+async def start_cache_warmup():
+    # 시작을 막지 않도록 백그라운드에서 실행
+    app.state.cache_warmer = (
+        asyncio.create_task(warm_cache.warm_on_schedule(WARM_CACHE_LOG, WARM_CACHE_INTERVAL))
+        if WARM_CACHE_LOG else None
+    )
+
+@app.on_event("shutdown")
+async def stop_cache_warmup():
+    if app.state.cache_warmer is not None:
+        app.state.cache_warmer.cancel()
+
+@app.on_event("shutdown")
+async def stop_cache_sweeper():
+    app.state.cache_sweeper.cancel()
+    await asyncio.to_thread(get_recommendation_cache().flush)
+    if pharmacy_service_started():
+        await asyncio.to_thread(get_pharmacy_service().flush)
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_queue.stop()
+
+@app.on_event("startup")
+async def check_offline_data():
+    # 파일만 확인하고 로드는 첫 약국 조회 때 (시작 시간 유지)
+    check_zip_index()
+
+@app.on_event("startup")
+async def startup_http_client():
+    await start_http_client()
+
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    await close_http_client()
 @app.get("/", response_class=HTMLResponse)
 async def get_landing(request: Request):
     """Render the landing page"""
-    return templates.TemplateResponse(
-        "landing.html", 
-        {"request": request}
-    )
+    return page_cache.get("landing.html").response(request, REVALIDATE_CACHE_CONTROL)
 
 
 @app.get("/form", response_class=HTMLResponse)
 async def get_form(request: Request):
     """Render the form page"""
-    return templates.TemplateResponse(
-        "index.html", 
-        {"request": request}
+    return page_cache.get("index.html", stream_results=STREAM_RESULTS).response(request, REVALIDATE_CACHE_CONTROL)
+
+def get_pharmacy_service():
+    """Pharmacy service provider; the pharmacy path is imported on first use, not at cold start"""
+    from .pharmacy_service import get_pharmacy_service as provider
+    return provider()
+
+def pharmacy_service_started() -> bool:
+    module = sys.modules.get(f"{__package__}.pharmacy_service")
+    return module is not None and module.get_pharmacy_service.cache_info().currsize > 0
+
+def pharmacy_cache_stats() -> Dict[str, Any]:
+    return get_pharmacy_service().cache_stats() if pharmacy_service_started() else {}
+
+async def lookup_pharmacies_for_page(zipcode: str) -> Dict[str, Any]:
+    """Pharmacy lookup for the results page; failures become a message, not an error page"""
+    from .pharmacy_service import PharmacyLookupError
+
+    if not re.fullmatch(r"\d{5}", zipcode):
+        return {"pharmacies": [], "error": "Please enter a valid 5-digit ZIP code"}
+    try:
+        pharmacies = await get_pharmacy_service().find_pharmacies(zipcode)
+        return {"pharmacies": pharmacies, "error": None}
+    except PharmacyLookupError as e:
+        metrics.record_error(e)
+        return {"pharmacies": [], "error": e.message}
+    except RateLimitedError:
+        return {"pharmacies": [], "error": "Too many pharmacy searches right now. Please try again shortly."}
+    except httpx.TimeoutException as e:
+        logger.error("Request to Google API timed out")
+        metrics.record_error(e)
+        return {"pharmacies": [], "error": "Request to Google API timed out"}
+    except httpx.RequestError as e:
+        logger.error(f"Request error: {str(e)}")
+        metrics.record_error(e)
+        return {"pharmacies": [], "error": "Error connecting to Google API"}
+
+async def build_recommendations(symptom_list: List[str], gender: str, age: str, allergic: str,
+                                zipcode: str) -> Dict[str, Any]:
+    """Results page context: recommendations plus pharmacies when a ZIP code is given"""
+    recommendations = get_perplexity_service().get_recommendations(symptom_list, gender, age, allergic)
+    if zipcode:
+        # ZIP 코드가 있으면 추천과 약국 검색을 동시에 실행
+        (medications, management_lists, stale), pharmacy_result = await asyncio.gather(
+            recommendations, lookup_pharmacies_for_page(zipcode)
+        )
+    else:
+        medications, management_lists, stale = await recommendations
+        pharmacy_result = {"pharmacies": [], "error": None}
+
+    log_event(
+        logger, "recommendations", "Recommendations ready",
+        medications=medications, management_lists=management_lists
     )
+    return {
+        "medications": medications,
+        "stale": stale,
+        "to_do_list": management_lists["to_do_list"],
+        "do_not_list": management_lists["do_not_list"],
+        "pharmacies": pharmacy_result["pharmacies"],
+        "pharmacy_error": pharmacy_result["error"],
+    }
+
+async def run_recommendation_job(params: Dict[str, Any]) -> Dict[str, Any]:
+    # 제출 시점에 한도를 넘은 클라이언트의 작업은 캐시로만 응답
+    with client_over_limit(params.get("client_retry_after")):
+        return await build_recommendations(
+            params["symptom_list"], params["gender"], params["age"], params["allergic"], params["zipcode"]
+        )
+
+job_queue = JobQueue(get_job_backend(), run_recommendation_job)
 
 @app.post("/recommend", response_class=HTMLResponse)
 async def recommend(request: Request):
@@ -73,6 +372,7 @@ async def recommend(request: Request):
         gender = form_data.get("gender", "not specified")
         age = form_data.get("age", "not specified")
         allergic = form_data.get("allergic", "none")
+        zipcode = form_data.get("zipcode", "").strip()
         
         # Split and clean symptoms
         symptom_list = [s.strip() for s in symptoms.split(',') if s.strip()]
@@ -82,32 +382,57 @@ async def recommend(request: Request):
                 "index.html",
                 {
                     "request": request,
-                    "error": "증상을 하나 이상 선택해주세요."
+                    "error": "증상을 하나 이상 선택해주세요.",
+                    "stream_results": STREAM_RESULTS
                 }
             )
             
-        perplexity_service = get_perplexity_service()
-        medications, management_lists = perplexity_service.get_combined_recommendations(symptom_list, gender, age, allergic)
-        
-        logger.info(f"Received medications: {medications}")
-        logger.info(f"Received management lists: {management_lists}")
-        
+        if JOB_MODE:
+            try:
+                job = await job_queue.submit({
+                    "symptoms": symptoms,
+                    "symptom_list": symptom_list,
+                    "gender": gender,
+                    "age": age,
+                    "allergic": allergic,
+                    "zipcode": zipcode,
+                    "client_retry_after": client_retry_after(),
+                })
+            except QueueFullError as e:
+                logger.warning(f"Job queue full: {e}")
+                metrics.record_error(e)
+                return templates.TemplateResponse(
+                    "error.html",
+                    {
+                        "request": request,
+                        "error_title": "요청이 많습니다",
+                        "error_message": "잠시 후 다시 시도해주세요.",
+                        "error_detail": str(e),
+                        "debug_mode": os.getenv("DEBUG", "False").lower() == "true"
+                    },
+                    status_code=503
+                )
+            return RedirectResponse(f"/jobs/{job.id}", status_code=303)
+
+        result = await build_recommendations(symptom_list, gender, age, allergic, zipcode)
         return templates.TemplateResponse(
             "results.html",
             {
                 "request": request,
-                "medications": medications,
                 "symptoms": symptoms,
                 "gender": gender,
                 "age": age,
                 "allergic": allergic,
-                "to_do_list": management_lists["to_do_list"],
-                "do_not_list": management_lists["do_not_list"]
+                "zipcode": zipcode,
+                **result
             }
         )
         
+    except RateLimitedError:
+        raise
     except Exception as e:
         logger.exception("Error in recommend endpoint")
+        metrics.record_error(e)
         return templates.TemplateResponse(
             "error.html",
             {
@@ -120,126 +445,265 @@ async def recommend(request: Request):
             status_code=500
         )
 
+@app.post("/recommend/stream", response_class=HTMLResponse)
+async def recommend_stream(request: Request):
+    """Render the results page progressively while the completion streams in"""
+    form_data = await request.form()
+    symptoms = form_data.get("symptoms", "")
+    gender = form_data.get("gender", "not specified")
+    age = form_data.get("age", "not specified")
+    allergic = form_data.get("allergic", "none")
+    zipcode = form_data.get("zipcode", "").strip()
+
+    symptom_list = [s.strip() for s in symptoms.split(',') if s.strip()]
+    if not symptom_list:
+        return templates.TemplateResponse(
+            "index.html",
+            {
+                "request": request,
+                "error": "증상을 하나 이상 선택해주세요.",
+                "stream_results": STREAM_RESULTS
+            }
+        )
+
+    # 캐시 조회와 한도 확인은 응답을 시작하기 전에: 한도를 넘었고 캐시에 없으면 /recommend와 같은 429
+    perplexity_service = get_perplexity_service()
+    events = SectionedEvents(
+        perplexity_service.stream_combined_recommendations(symptom_list, gender, age, allergic)
+    )
+
+    # 약국 검색은 스트리밍과 동시에 시작하고, 템플릿이 해당 위치에서 결과를 기다림
+    pharmacy_task = asyncio.create_task(lookup_pharmacies_for_page(zipcode)) if zipcode else None
+
+    async def lookup_pharmacies():
+        return await pharmacy_task
+    template = stream_templates.get_template("results_stream.html")
+    body = template.generate_async(
+        events=events,
+        symptoms=symptoms,
+        gender=gender,
+        age=age,
+        allergic=allergic,
+        zipcode=zipcode,
+        lookup_pharmacies=lookup_pharmacies
+    )
+    return StreamingResponse(body, media_type="text/html")
+
 @app.get("/api/pharmacies")
 async def get_nearby_pharmacies(
     zipcode: str,
-    perplexity_service: PerplexityService = Depends(get_perplexity_service)
-    
+    limit: int = Query(3, ge=1, le=20),
+    offset: int = Query(0, ge=0),
+    open_now: bool = False,
+    pharmacy_service=Depends(get_pharmacy_service)
 ):
-    """Get nearby pharmacies based on zipcode"""
+    """Nearby pharmacies for a zipcode, nearest first; page with offset/limit"""
+    from .pharmacy_service import PharmacyLookupError
+
     try:
-        api_key = os.getenv("GOOGLE_PLACES_API_KEY")
-        
-        if not api_key:
-            logger.error("Google Places API key not found in environment variables")
-            return JSONResponse(
-                status_code=500,
-                content={"error": "API key not configured. Please contact the administrator."}
-            )
-        
-        logger.info(f"Searching pharmacies for zipcode: {zipcode}")
-        
-        # Google Geocoding API call to convert zipcode to coordinates
-        geocode_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={zipcode}&key={api_key}"
-        geocode_response = requests.get(geocode_url, timeout=10)
-        
-        if geocode_response.status_code != 200:
-            logger.error(f"Geocode API HTTP error: {geocode_response.status_code}")
-            return JSONResponse(
-                status_code=geocode_response.status_code,
-                content={"error": f"Error connecting to geocoding service: {geocode_response.status_code}"}
-            )
-        
-        geocode_data = geocode_response.json()
-        
-        if geocode_data["status"] != "OK":
-            logger.error(f"Geocode API error: {geocode_data.get('status')}")
-            return JSONResponse(
-                status_code=400,
-                content={"error": f"Geocoding service error: {geocode_data.get('status')}"}
-            )
-        
-        if not geocode_data["results"]:
-            logger.error("Geocode API returned no results")
-            return JSONResponse(
-                status_code=404,
-                content={"error": "Location not found for this ZIP code"}
-            )
-        
-        # Extract location data
-        location = geocode_data["results"][0]["geometry"]["location"]
-        lat, lng = location["lat"], location["lng"]
-        logger.info(f"Location found - latitude: {lat}, longitude: {lng}")
-        
-        # Google Places API call to find nearby pharmacies
-        places_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location={lat},{lng}&radius=5000&type=pharmacy&key={api_key}"
-        places_response = requests.get(places_url, timeout=10)
-        
-        if places_response.status_code != 200:
-            logger.error(f"Places API HTTP error: {places_response.status_code}")
-            return JSONResponse(
-                status_code=places_response.status_code,
-                content={"error": f"Error connecting to places service: {places_response.status_code}"}
-            )
-        
-        places_data = places_response.json()
-        
-        if places_data["status"] != "OK":
-            logger.error(f"Places API error: {places_data.get('status')}")
-            return JSONResponse(
-                status_code=400,
-                content={"error": f"Places service error: {places_data.get('status')}"}
-            )
-        
-        if not places_data["results"]:
-            logger.warning("No pharmacies found near this location")
-            return JSONResponse(
-                status_code=404,
-                content={"error": "No pharmacies found near this location"}
-            )
-        
-        # Process pharmacy data
-        pharmacies = []
-        for place in places_data["results"][:3]:
-            pharmacy = {
-                "name": place["name"],
-                "address": place.get("vicinity", "Address not available"),
-                "distance": "Nearby"  # For exact distance calculation, we'd need to use Distance Matrix API
-            }
-            pharmacies.append(pharmacy)
-        
-        logger.info(f"Found {len(pharmacies)} pharmacies near {zipcode}")
-        return JSONResponse(content={"pharmacies": pharmacies})
-        
-    except requests.exceptions.Timeout:
+        page = await pharmacy_service.search_pharmacies(zipcode, limit=limit, offset=offset, open_now=open_now)
+        return JSONResponse(content=page)
+
+    except PharmacyLookupError as e:
+        metrics.record_error(e)
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"error": e.message}
+        )
+    except httpx.TimeoutException as e:
         logger.error("Request to Google API timed out")
+        metrics.record_error(e)
         return JSONResponse(
             status_code=504,
             content={"error": "Request to Google API timed out"}
         )
-    except requests.exceptions.RequestException as e:
+    except httpx.RequestError as e:
         logger.error(f"Request error: {str(e)}")
+        metrics.record_error(e)
         return JSONResponse(
             status_code=500,
             content={"error": "Error connecting to Google API"}
         )
+    except RateLimitedError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
+        metrics.record_error(e)
         return JSONResponse(
             status_code=500,
             content={"error": "An unexpected error occurred"}
         )
     
+@app.post("/api/recommendations/batch")
+async def batch_recommendations(batch: BatchRequest):
+    """Recommendations for many profiles, streamed back as NDJSON as each completes"""
+    if not batch.profiles:
+        raise HTTPException(status_code=422, detail="At least one profile is required")
+    if len(batch.profiles) > BATCH_MAX_PROFILES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_PROFILES} profiles per batch")
+
+    async def ndjson():
+        async for result in run_batch(get_perplexity_service(), batch.profiles, get_batch_rate_limiter()):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(job_request: RecommendationJobRequest):
+    """Queue a recommendation job; poll status_url or subscribe to events_url"""
+    symptom_list = job_request.symptom_list()
+    if not symptom_list:
+        raise HTTPException(status_code=422, detail="At least one symptom is required")
+    try:
+        job = await job_queue.submit({
+            "symptoms": ", ".join(symptom_list),
+            "symptom_list": symptom_list,
+            "gender": job_request.gender,
+            "age": job_request.age,
+            "allergic": job_request.allergic,
+            "zipcode": job_request.zipcode.strip(),
+        })
+    except QueueFullError as e:
+        metrics.record_error(e)
+        raise HTTPException(status_code=503, detail="Too many queued jobs; try again shortly")
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events",
+        "page_url": f"/jobs/{job.id}",
+    }
+
+@app.get("/api/jobs/stats")
+async def job_stats():
+    """Queue depth and worker counters for background jobs"""
+    return job_queue.stats()
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, with its result once done"""
+    job = await job_queue.backend.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent status events until the job finishes"""
+    if await job_queue.backend.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    async def status_events():
+        # 상태를 읽기 전에 구독해야 그 사이의 변경을 놓치지 않음
+        with job_queue.subscribe(job_id) as changes:
+            while True:
+                job = await job_queue.backend.get(job_id)
+                if job is None:
+                    yield "event: gone\ndata: {}\n\n"
+                    return
+                yield f"event: status\ndata: {json.dumps({'status': job.status})}\n\n"
+                if job.finished:
+                    return
+                await changes.wait(JOB_EVENTS_KEEPALIVE)
+
+    return StreamingResponse(
+        status_events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}", response_class=HTMLResponse)
+async def job_page(request: Request, job_id: str):
+    """Results for a background job, or a page that waits for it to finish"""
+    job = await job_queue.backend.get(job_id)
+    if job is None:
+        return templates.TemplateResponse(
+            "error.html",
+            {
+                "request": request,
+                "error_title": "결과를 찾을 수 없습니다",
+                "error_message": "요청이 만료되었거나 존재하지 않습니다. 다시 검색해주세요.",
+                "error_detail": job_id,
+                "debug_mode": os.getenv("DEBUG", "False").lower() == "true"
+            },
+            status_code=404
+        )
+
+    params = job.params
+    if job.status == DONE:
+        response = templates.TemplateResponse(
+            "results.html",
+            {
+                "request": request,
+                "symptoms": params["symptoms"],
+                "gender": params["gender"],
+                "age": params["age"],
+                "allergic": params["allergic"],
+                "zipcode": params["zipcode"],
+                **job.result
+            }
+        )
+    elif job.status == FAILED:
+        response = templates.TemplateResponse(
+            "error.html",
+            {
+                "request": request,
+                "error_title": "오류가 발생했습니다",
+                "error_message": job.error,
+                "error_detail": job_id,
+                "debug_mode": os.getenv("DEBUG", "False").lower() == "true"
+            },
+            status_code=500
+        )
+    else:
+        response = templates.TemplateResponse(
+            "job_pending.html",
+            {
+                "request": request,
+                "job": job,
+                "status_url": f"/api/jobs/{job.id}",
+                "events_url": f"/api/jobs/{job.id}/events",
+            }
+        )
+    # 상태에 따라 내용이 바뀌므로 캐시하지 않음
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Recommendation cache and request coalescing counters"""
+    return {
+        "cache": get_recommendation_cache().stats(),
+        "inflight": get_perplexity_service().inflight_stats(),
+        "similarity": get_perplexity_service().similarity_stats(),
+        "warmup": warm_cache.last_report(),
+        **pharmacy_cache_stats(),
+    }
+
+@app.get("/api/http/stats")
+async def http_stats():
+    """Connection pool reuse per upstream host, Perplexity retry/breaker state and rate limiters"""
+    return {
+        **http_client_stats(),
+        "perplexity": get_perplexity_service().resilience_stats(),
+        "rate_limits": rate_limit_stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text exposition of latency, cache and error metrics"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 # 앱 설정 부분 (app 변수 설정 후)
 @app.exception_handler(PerplexityAPIError)
 async def perplexity_api_exception_handler(request: Request, exc: PerplexityAPIError):
     """Handle Perplexity API errors"""
     logger.error(f"Perplexity API Error: {exc}")
+    metrics.record_error(exc)
     return templates.TemplateResponse(
         "error.html",
         {
@@ -252,10 +716,35 @@ async def perplexity_api_exception_handler(request: Request, exc: PerplexityAPIE
         status_code=503
     )
 
+@app.exception_handler(RateLimitedError)
+async def rate_limited_exception_handler(request: Request, exc: RateLimitedError):
+    """Over a client or upstream rate limit and nothing cached to answer with"""
+    logger.warning(f"Rejected {request.url.path}: {exc}")
+    headers = {"Retry-After": exc.retry_after_header}
+    if request.url.path.startswith("/api/"):
+        return JSONResponse(
+            status_code=429,
+            content={"error": "Too many requests; please retry later"},
+            headers=headers
+        )
+    return templates.TemplateResponse(
+        "error.html",
+        {
+            "request": request,
+            "error_title": "Too Many Requests",
+            "error_message": "We are receiving too many requests right now. Please try again in a few moments.",
+            "error_detail": str(exc),
+            "debug_mode": os.getenv("DEBUG", "False").lower() == "true"
+        },
+        status_code=429,
+        headers=headers
+    )
+
 @app.exception_handler(ParsingError)
 async def parsing_exception_handler(request: Request, exc: ParsingError):
     """Handle parsing errors"""
     logger.error(f"Parsing Error: {exc}")
+    metrics.record_error(exc)
     return templates.TemplateResponse(
         "error.html",
         {
@@ -272,6 +761,7 @@ async def parsing_exception_handler(request: Request, exc: ParsingError):
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle all other exceptions"""
     logger.error(f"Unhandled Exception: {exc}")
+    metrics.record_error(exc)
     return templates.TemplateResponse(
         "error.html",
         {
@@ -286,4 +776,5 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 # Server startup code
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
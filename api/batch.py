@@ -0,0 +1,124 @@
+"""
+Bulk recommendations for partner integrations.
+
+Profiles are deduplicated by cache key. Cached profiles are answered
+immediately; the rest fan out to Perplexity under a concurrency bound
+and a token-bucket rate limit. Results are yielded as each unique
+profile completes, once per requesting index.
+"""
+import os
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Union
+
+from pydantic import BaseModel, Field, field_validator
+
+from .cache_keys import SymptomProfile
+from .rate_limit import RateLimitedError, TokenBucket
+from .perplexity_service import PerplexityService
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_PROFILES = int(os.getenv("BATCH_MAX_PROFILES", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+
+class BatchProfile(BaseModel):
+    symptoms: Union[List[str], str]
+    gender: str = "not specified"
+    age: str = "not specified"
+    allergic: str = "none"
+
+    @field_validator("gender", "age", "allergic", mode="before")
+    @classmethod
+    def _as_text(cls, value: Any) -> Any:
+        # 폼과 같이 문자열로 비교하도록 숫자(예: "age": 42)도 받음
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        return value
+
+    def symptom_list(self) -> List[str]:
+        symptoms = self.symptoms.split(",") if isinstance(self.symptoms, str) else self.symptoms
+        return [s.strip() for s in symptoms if s.strip()]
+
+
+class BatchRequest(BaseModel):
+    profiles: List[BatchProfile] = Field(default_factory=list)
+
+
+def _result(index: int, profile: BatchProfile, medications, management_lists,
+            cached: bool, stale: bool) -> Dict[str, Any]:
+    return {
+        "index": index,
+        "symptoms": profile.symptom_list(),
+        "status": "ok" if medications else "empty",
+        "cached": cached,
+        "stale": stale,
+        "medications": medications,
+        "to_do_list": management_lists["to_do_list"],
+        "do_not_list": management_lists["do_not_list"],
+    }
+
+
+def _error(index: int, profile: BatchProfile, message: str) -> Dict[str, Any]:
+    return {"index": index, "symptoms": profile.symptom_list(), "status": "error", "error": message}
+
+
+async def run_batch(service: PerplexityService, profiles: List[BatchProfile],
+                    limiter: TokenBucket, concurrency: int = BATCH_CONCURRENCY,
+                    ) -> AsyncIterator[Dict[str, Any]]:
+    """Yield one result per profile, in completion order"""
+    # 같은 캐시 키를 가진 프로필은 한 번만 조회
+    groups: Dict[str, List[int]] = {}
+    for index, profile in enumerate(profiles):
+        symptom_list = profile.symptom_list()
+        if not symptom_list:
+            yield _error(index, profile, "At least one symptom is required")
+            continue
+        key = SymptomProfile.from_request(symptom_list, profile.gender, profile.age, profile.allergic).cache_key
+        groups.setdefault(key, []).append(index)
+
+    misses: Dict[str, List[int]] = {}
+    for key, indexes in groups.items():
+        profile = profiles[indexes[0]]
+        cached = service.cached_recommendations(profile.symptom_list(), profile.gender, profile.age, profile.allergic)
+        if cached is None:
+            misses[key] = indexes
+            continue
+        medications, management_lists, stale = cached
+        for index in indexes:
+            yield _result(index, profiles[index], medications, management_lists, cached=True, stale=stale)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(key: str):
+        profile = profiles[misses[key][0]]
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                return key, await service.fetch_recommendations(
+                    profile.symptom_list(), profile.gender, profile.age, profile.allergic
+                ), None
+            except RateLimitedError as e:
+                logger.warning(f"Batch recommendation rejected: {e}")
+                return key, None, e
+            except Exception as e:
+                logger.exception("Batch recommendation failed")
+                return key, None, e
+
+    tasks = [asyncio.create_task(fetch(key)) for key in misses]
+    try:
+        for completed in asyncio.as_completed(tasks):
+            key, recommendations, error = await completed
+            for index in misses[key]:
+                if isinstance(error, RateLimitedError):
+                    yield _error(index, profiles[index], "Rate limit exceeded; retry later")
+                elif error is not None:
+                    yield _error(index, profiles[index], "Recommendation service error")
+                else:
+                    medications, management_lists = recommendations
+                    yield _result(index, profiles[index], medications, management_lists, cached=False, stale=False)
+    finally:
+        # 클라이언트가 연결을 끊으면 남은 조회를 취소
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,494 @@
+import os
+import sys
+import time
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """Interface shared by the in-memory and on-disk caches"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Return a live entry or None"""
+
+    @abstractmethod
+    def get_stale(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """Return (value, is_stale) for a live entry or one still within its grace period"""
+
+    @abstractmethod
+    def contains(self, key: str) -> bool:
+        """Whether a live entry exists, without counting a lookup or marking it as used"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store an entry"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove an entry if present"""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every entry"""
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Remove expired entries and return how many were removed"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring"""
+
+    def flush(self):
+        """Persist pending writes (no-op for volatile backends)"""
+
+    def close(self):
+        """Release resources held by the backend"""
+        self.flush()
+
+
+class TTLCache(CacheBackend):
+    """
+    Thread-safe LRU cache with per-entry TTL and a memory budget.
+
+    Entries are evicted in least-recently-used order whenever the entry
+    count or the estimated byte size exceeds its limit. Expired entries
+    are kept for `grace` more seconds so get_stale() can still serve
+    them, then removed on lookup and by periodic sweeps.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: float = 3600, sweep_interval: float = 60, grace: float = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.grace = grace
+        self.sweep_interval = sweep_interval
+
+        # key -> (expires_at, size, value)
+        self._data: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        """Rough memory estimate of a cached value"""
+        if isinstance(value, str):
+            return len(value.encode("utf-8"))
+        return sys.getsizeof(value)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a live entry and mark it as recently used"""
+        found = self._lookup(key, allow_stale=False)
+        return found[0] if found else None
+
+    def get_stale(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """Return (value, is_stale), serving expired entries within the grace period"""
+        return self._lookup(key, allow_stale=True)
+
+    def _lookup(self, key: str, allow_stale: bool) -> Optional[Tuple[Any, bool]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, size, value = entry
+            now = time.monotonic()
+            stale = expires_at <= now
+            if stale and (not allow_stale or expires_at + self.grace <= now):
+                if expires_at + self.grace <= now:
+                    self._remove(key)
+                    self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return value, stale
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store an entry, evicting old ones to stay within budget"""
+        size = self._estimate_size(value)
+        if size > self.max_bytes:
+            logger.warning(f"Cache entry too large to store ({size} bytes)")
+            return
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._data[key] = (expires_at, size, value)
+            self._bytes += size
+
+            self._maybe_sweep()
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._data))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def sweep(self) -> int:
+        """Remove every expired entry and return how many were removed"""
+        with self._lock:
+            now = time.monotonic()
+            expired = [key for key, (expires_at, _, _) in self._data.items() if expires_at + self.grace <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+            self._last_sweep = now
+            return len(expired)
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    def _remove(self, key: str):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "grace": self.grace,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk cache stored in a SQLite database in WAL mode.
+
+    Writes, deletes and access times are buffered in memory and committed
+    in batches on a separate writer connection; inside an event loop the
+    batch is committed on a worker thread, so a request never waits on
+    the database lock (busy_timeout). Buffered entries, including a batch
+    being committed, are visible to readers of this process. TTL and LRU
+    eviction are enforced in the store, so every worker sharing the file
+    sees the same entries. Expired entries are kept for `grace` more
+    seconds for get_stale().
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float = 3600,
+                 batch_size: int = 32, flush_interval: float = 5, grace: float = 0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.grace = grace
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # _lock은 메모리 버퍼만 보호하고, _write_lock은 쓰기 연결을 한 번에 하나의 flush만 쓰도록 함
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        # key -> (expires_at, value)
+        self._pending: Dict[str, Tuple[float, Any]] = {}
+        # 커밋 중인 배치 (커밋이 끝날 때까지 읽기에서 보임)
+        self._writing: Dict[str, Tuple[float, Any]] = {}
+        self._touched: Dict[str, float] = {}
+        self._deleted: Set[str] = set()
+        self._last_flush = time.time()
+        self._flush_scheduled = False
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = self._connect()
+        self._writer = self._connect()
+        self._writer.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._writer.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_entries_last_access "
+            "ON cache_entries (last_access)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        found = self._lookup(key, allow_stale=False)
+        return found[0] if found else None
+
+    def get_stale(self, key: str) -> Optional[Tuple[Any, bool]]:
+        return self._lookup(key, allow_stale=True)
+
+    def _lookup(self, key: str, allow_stale: bool) -> Optional[Tuple[Any, bool]]:
+        with self._lock:
+            found = self._find(key)
+            if found is None:
+                self.misses += 1
+                return None
+            expires_at, value = found
+
+            now = time.time()
+            stale = expires_at <= now
+            if stale and (not allow_stale or expires_at + self.grace <= now):
+                if expires_at + self.grace <= now:
+                    self.delete(key)
+                    self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._touched[key] = now
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+        self._maybe_flush()
+        return value, stale
+
+    def _find(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Buffered or stored (expires_at, value) for a key, without counting or touching it"""
+        found = self._pending.get(key)
+        if found is None and key not in self._deleted:
+            found = self._writing.get(key)
+            if found is None:
+                found = self._conn.execute(
+                    "SELECT expires_at, value FROM cache_entries WHERE key = ?", (key,)
+                ).fetchone()
+        return found
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            found = self._find(key)
+            return found is not None and found[0] > time.time()
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._deleted.discard(key)
+            self._pending[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+        self._maybe_flush()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._pending.pop(key, None)
+            self._touched.pop(key, None)
+            self._deleted.add(key)
+
+    def clear(self):
+        with self._write_lock, self._lock:
+            self._pending.clear()
+            self._touched.clear()
+            self._deleted.clear()
+            self._writer.execute("DELETE FROM cache_entries")
+
+    def sweep(self) -> int:
+        self.flush()
+        with self._write_lock:
+            cursor = self._writer.execute(
+                "DELETE FROM cache_entries WHERE expires_at <= ?", (time.time() - self.grace,)
+            )
+        with self._lock:
+            self.expirations += cursor.rowcount
+        return cursor.rowcount
+
+    def _flush_due(self) -> bool:
+        return (len(self._pending) + len(self._touched) + len(self._deleted) >= self.batch_size
+                or time.time() - self._last_flush >= self.flush_interval)
+
+    def _maybe_flush(self):
+        with self._lock:
+            if self._flush_scheduled or not self._flush_due():
+                return
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            self._flush_scheduled = loop is not None
+        if loop is None:
+            # 이벤트 루프 밖(CLI 등)에서는 바로 커밋
+            self.flush()
+        else:
+            loop.run_in_executor(None, self._flush_in_background)
+
+    def _flush_in_background(self):
+        try:
+            # 커밋하는 동안 다시 쌓인 배치도 이어서 커밋
+            while True:
+                self.flush()
+                with self._lock:
+                    if not self._flush_due():
+                        break
+        except Exception as e:
+            logger.warning(f"Cache flush to {self.path} failed; will retry: {e}")
+        finally:
+            self._flush_scheduled = False
+
+    def flush(self):
+        """Commit buffered writes in one transaction and enforce the size limit"""
+        with self._write_lock:
+            with self._lock:
+                self._last_flush = time.time()
+                if not self._pending and not self._touched and not self._deleted:
+                    return
+                self._writing, self._pending = self._pending, {}
+                touched, self._touched = self._touched, {}
+                deleted, self._deleted = self._deleted, set()
+
+            now = time.time()
+            try:
+                with self._writer:
+                    self._writer.execute("BEGIN")
+                    self._writer.executemany(
+                        "DELETE FROM cache_entries WHERE key = ?", [(key,) for key in deleted]
+                    )
+                    self._writer.executemany(
+                        "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, last_access) "
+                        "VALUES (?, ?, ?, ?)",
+                        [(key, value, expires_at, now) for key, (expires_at, value) in self._writing.items()],
+                    )
+                    self._writer.executemany(
+                        "UPDATE cache_entries SET last_access = ? WHERE key = ?",
+                        [(accessed, key) for key, accessed in touched.items()],
+                    )
+                    cursor = self._writer.execute(
+                        "DELETE FROM cache_entries WHERE key IN ("
+                        "SELECT key FROM cache_entries ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+            except sqlite3.Error:
+                # 커밋하지 못한 배치는 다음 flush에서 다시 시도 (그 사이 새로 들어온 값이 우선)
+                with self._lock:
+                    for key, entry in self._writing.items():
+                        if key not in self._deleted:
+                            self._pending.setdefault(key, entry)
+                    for key, accessed in touched.items():
+                        self._touched.setdefault(key, accessed)
+                    self._deleted |= {key for key in deleted if key not in self._pending}
+                    self._writing = {}
+                raise
+            with self._lock:
+                self.evictions += cursor.rowcount
+                self._writing = {}
+
+    def close(self):
+        self.flush()
+        with self._write_lock, self._lock:
+            self._writer.close()
+            self._conn.close()
+
+    def _stored(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+    def __len__(self) -> int:
+        self.flush()
+        return self._stored()
+
+    def stats(self) -> Dict[str, Any]:
+        # 통계 조회가 flush를 일으키지 않도록 저장된 항목과 버퍼를 따로 보고
+        stored = self._stored()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                "entries": stored,
+                "pending": len(self._pending) + len(self._writing),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "grace": self.grace,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# 프로세스 전체에서 공유하는 추천 결과 캐시
+@lru_cache(maxsize=None)
+def get_recommendation_cache() -> CacheBackend:
+    """
+    Process-wide cache for combined recommendations.
+
+    RECOMMENDATION_CACHE_BACKEND selects "memory" (default) or "sqlite".
+    Expired entries stay servable as stale for RECOMMENDATION_CACHE_GRACE
+    seconds while they are refreshed.
+    """
+    backend = os.getenv("RECOMMENDATION_CACHE_BACKEND", "memory").lower()
+    max_entries = int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "1024"))
+    ttl = float(os.getenv("RECOMMENDATION_CACHE_TTL", "3600"))
+    grace = float(os.getenv("RECOMMENDATION_CACHE_GRACE", "86400"))
+
+    if backend == "sqlite":
+        path = os.getenv(
+            "RECOMMENDATION_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "meditrek_cache.sqlite3"),
+        )
+        logger.info(f"Using SQLite recommendation cache at {path}")
+        return SQLiteCache(path, max_entries=max_entries, ttl=ttl, grace=grace)
+
+    if backend != "memory":
+        logger.warning(f"Unknown cache backend '{backend}', falling back to memory")
+    return TTLCache(
+        max_entries=max_entries,
+        max_bytes=int(os.getenv("RECOMMENDATION_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        ttl=ttl,
+        grace=grace,
+    )
@@ -0,0 +1,104 @@
+import re
+import json
+import hashlib
+from dataclasses import dataclass
+from typing import Iterable, Tuple
+
+from .recommendation_codec import RESULT_VERSION
+
+# v2: 월/주/일 단위 나이를 영아 구간으로 분류 (v1에서는 "6 months"가 6-11로 저장됨)
+CACHE_KEY_VERSION = "v2"
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = re.compile(r"^[\W_]+|[\W_]+$")
+_ALLERGY_SEPARATORS = re.compile(r"[,;/]|\band\b")
+# 숫자 하나와 선택적 단위만 허용 ("40", "40 yrs", "6 months", "3 weeks old")
+_AGE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*"
+    r"(years?|yrs?|y|yo|y/o|months?|mos?|weeks?|wks?|w|days?|d)?\.?"
+    r"(?:\s*old)?"
+)
+_AGE_UNIT_YEARS = {"month": 12, "mo": 12, "week": 52, "wk": 52, "w": 52, "day": 365, "d": 365}
+
+# (upper bound exclusive, bucket label)
+_AGE_BUCKETS = [
+    (2, "0-1"),
+    (6, "2-5"),
+    (12, "6-11"),
+    (18, "12-17"),
+    (30, "18-29"),
+    (45, "30-44"),
+    (65, "45-64"),
+]
+
+_GENDER_ALIASES = {
+    "m": "male", "male": "male", "man": "male", "boy": "male",
+    "f": "female", "female": "female", "woman": "female", "girl": "female",
+    "other": "other",
+}
+
+_NO_ALLERGY_TOKENS = {"", "none", "no", "nothing", "n/a", "na", "not specified"}
+
+
+def normalize_token(text: str) -> str:
+    """Lower-case, collapse whitespace and trim punctuation"""
+    text = _WHITESPACE.sub(" ", text.lower()).strip()
+    return _EDGE_PUNCTUATION.sub("", text)
+
+
+def normalize_symptoms(symptoms: Iterable[str]) -> Tuple[str, ...]:
+    """Sorted, de-duplicated symptom tokens"""
+    tokens = {normalize_token(s) for s in symptoms}
+    tokens.discard("")
+    return tuple(sorted(tokens))
+
+
+def normalize_age(age: str) -> str:
+    """Map a free-text age to a coarse bucket; anything but a single age is "unknown" """
+    match = _AGE.fullmatch(normalize_token(str(age)))
+    if not match:
+        return "unknown"
+    unit = (match.group(2) or "y").rstrip("s")
+    years = float(match.group(1)) / _AGE_UNIT_YEARS.get(unit, 1)
+    for upper, label in _AGE_BUCKETS:
+        if years < upper:
+            return label
+    return "65+"
+
+
+def normalize_gender(gender: str) -> str:
+    return _GENDER_ALIASES.get(normalize_token(str(gender)), "unspecified")
+
+
+def normalize_allergies(allergic: str) -> Tuple[str, ...]:
+    tokens = {normalize_token(t) for t in _ALLERGY_SEPARATORS.split(str(allergic).lower())}
+    tokens -= _NO_ALLERGY_TOKENS
+    return tuple(sorted(tokens))
+
+
+@dataclass(frozen=True)
+class SymptomProfile:
+    """Canonical form of a recommendation request"""
+    symptoms: Tuple[str, ...]
+    age_bucket: str
+    gender: str
+    allergies: Tuple[str, ...]
+
+    @classmethod
+    def from_request(cls, symptoms: Iterable[str], gender: str, age: str, allergic: str) -> "SymptomProfile":
+        return cls(
+            symptoms=normalize_symptoms(symptoms),
+            age_bucket=normalize_age(age),
+            gender=normalize_gender(gender),
+            allergies=normalize_allergies(allergic),
+        )
+
+    @property
+    def cache_key(self) -> str:
+        """Deterministic digest, identical across processes and restarts"""
+        payload = json.dumps(
+            [self.symptoms, self.age_bucket, self.gender, self.allergies],
+            separators=(",", ":"),
+        )
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"rec:{CACHE_KEY_VERSION}:r{RESULT_VERSION}:{digest}"
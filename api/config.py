@@ -0,0 +1,20 @@
+"""
+Process configuration.
+
+.env is loaded exactly once, when this module is first imported; entry
+points import it before any module that reads os.environ at import time.
+Variables already set in the environment take precedence.
+"""
+from dotenv import load_dotenv
+
+_loaded = False
+
+
+def load_config():
+    global _loaded
+    if not _loaded:
+        load_dotenv()
+        _loaded = True
+
+
+load_config()
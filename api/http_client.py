@@ -0,0 +1,151 @@
+import os
+import asyncio
+import logging
+import importlib.util
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response stream that frees its host slot once closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Transport wrapper capping concurrent requests per upstream host"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_per_host: int):
+        self._transport = transport
+        self._max_per_host = max_per_host
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self._max_per_host)
+        await semaphore.acquire()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+        # 응답 스트림이 닫힐 때 슬롯을 반환 (스트리밍 응답도 지원)
+        response.stream = _ReleasingStream(response.stream, semaphore.release)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class ConnectionStats:
+    """Count requests and newly opened connections per host"""
+
+    def __init__(self):
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.connections: Dict[str, int] = defaultdict(int)
+
+    async def on_request(self, request: httpx.Request):
+        host = request.url.host
+        self.requests[host] += 1
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == "connection.connect_tcp.complete":
+                self.connections[host] += 1
+
+        request.extensions["trace"] = trace
+
+    def snapshot(self) -> Dict[str, Any]:
+        hosts = {}
+        for host, count in self.requests.items():
+            opened = self.connections.get(host, 0)
+            hosts[host] = {
+                "requests": count,
+                "connections_opened": opened,
+                "reuse_ratio": round(1 - opened / count, 4) if count else 0.0,
+            }
+        return hosts
+
+
+connection_stats = ConnectionStats()
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build the shared client from HTTP_* environment settings"""
+    max_connections = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+    max_keepalive = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+    keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+    max_per_host = int(os.getenv("HTTP_POOL_MAX_PER_HOST", "50"))
+    http2 = os.getenv("HTTP2_ENABLED", "true").lower() == "true" and _http2_available()
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    transport = HostLimitedTransport(
+        httpx.AsyncHTTPTransport(limits=limits, http2=http2),
+        max_per_host=max_per_host,
+    )
+    logger.info(
+        f"HTTP client pool: max_connections={max_connections}, keepalive={max_keepalive}, "
+        f"per_host={max_per_host}, http2={http2}"
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(10.0),
+        event_hooks={"request": [connection_stats.on_request]},
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared async HTTP client with pooled keep-alive connections"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def start_http_client():
+    """Create the shared client at application startup"""
+    get_http_client()
+
+
+async def close_http_client():
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def http_client_stats() -> Dict[str, Any]:
+    return {
+        "open": _client is not None and not _client.is_closed,
+        "hosts": connection_stats.snapshot(),
+    }
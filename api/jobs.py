@@ -0,0 +1,263 @@
+"""
+Background jobs for recommendation requests.
+
+With JOB_MODE=true the form post enqueues a job and redirects to
+/jobs/<id> instead of holding the connection open for the whole upstream
+call. A bounded pool of workers (JOB_WORKERS) runs queued jobs; the page
+subscribes to /api/jobs/<id>/events (SSE) or polls /api/jobs/<id>.
+
+Jobs are stored by a JobBackend: in-process by default, or any class
+named by JOB_BACKEND="package.module:ClassName". Workers start on the
+first submitted job.
+"""
+import os
+import time
+import asyncio
+import secrets
+import logging
+import importlib
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .batch import BatchProfile
+from .metrics import JOB_DURATION, JOB_QUEUE_WAIT, record_error
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", "1000"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+
+
+class QueueFullError(Exception):
+    """The job queue is at JOB_MAX_QUEUE"""
+
+
+class RecommendationJobRequest(BatchProfile):
+    zipcode: str = ""
+
+
+@dataclass
+class Job:
+    id: str
+    params: Dict[str, Any]
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class JobBackend(ABC):
+    """Storage and queue for jobs; implementations may be shared across processes"""
+
+    @abstractmethod
+    async def enqueue(self, job: Job):
+        """Store a new job and queue it; raise QueueFullError when full"""
+
+    @abstractmethod
+    async def dequeue(self) -> Job:
+        """Wait for the next queued job"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Current state of a job, or None if unknown or expired"""
+
+    @abstractmethod
+    async def save(self, job: Job):
+        """Persist a job's updated state"""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Jobs waiting to be picked up"""
+
+
+class InMemoryJobBackend(JobBackend):
+    """Jobs in this process; finished jobs are kept for result_ttl seconds"""
+
+    def __init__(self, max_depth: int = JOB_MAX_QUEUE, result_ttl: float = JOB_RESULT_TTL):
+        self.max_depth = max_depth
+        self.result_ttl = result_ttl
+        self._jobs: Dict[str, Job] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        # 완료 시각 순서 -> 만료된 결과부터 제거
+        self._finished: Deque[Tuple[float, str]] = deque()
+
+    async def enqueue(self, job: Job):
+        self._expire()
+        if self._queue.qsize() >= self.max_depth:
+            raise QueueFullError(f"{self._queue.qsize()} jobs already queued")
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job.id)
+
+    async def dequeue(self) -> Job:
+        while True:
+            job = self._jobs.get(await self._queue.get())
+            if job is not None:
+                return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def save(self, job: Job):
+        self._jobs[job.id] = job
+        if job.finished:
+            self._finished.append((time.monotonic() + self.result_ttl, job.id))
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._finished and self._finished[0][0] <= now:
+            self._jobs.pop(self._finished.popleft()[1], None)
+
+
+def get_job_backend() -> JobBackend:
+    """Backend named by JOB_BACKEND: "memory" or "package.module:ClassName" """
+    name = os.getenv("JOB_BACKEND", "memory")
+    if name == "memory":
+        return InMemoryJobBackend()
+    module_name, _, class_name = name.partition(":")
+    backend = getattr(importlib.import_module(module_name), class_name)()
+    if not isinstance(backend, JobBackend):
+        raise TypeError(f"JOB_BACKEND {name} is not a JobBackend")
+    return backend
+
+
+class JobSubscription:
+    """
+    Change notifications for one job. The subscription is armed before the
+    caller reads the job, so a change made between that read and wait()
+    still wakes it.
+    """
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self._queue = queue
+        self._job_id = job_id
+        self._event = queue._watch(job_id)
+
+    async def wait(self, timeout: float):
+        """Return when the job has changed here since the last wait, or after timeout (other processes are polled)"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        # 호출자가 상태를 다시 읽기 전에 다음 변경을 받을 준비
+        self._event = self._queue._watch(self._job_id)
+
+
+class JobQueue:
+    """Runs jobs from a backend on at most `workers` concurrent tasks"""
+
+    def __init__(self, backend: JobBackend, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 workers: int = JOB_WORKERS):
+        self.backend = backend
+        self.handler = handler
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        # job id -> 상태 변경 시 깨울 이벤트와 대기 중인 구독자 수 (같은 프로세스의 구독자용)
+        self._changes: Dict[str, asyncio.Event] = {}
+        self._subscribers: Dict[str, int] = {}
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def submit(self, params: Dict[str, Any]) -> Job:
+        job = Job(id=secrets.token_urlsafe(16), params=params)
+        await self.backend.enqueue(job)
+        self.submitted += 1
+        self._ensure_workers()
+        return job
+
+    def _ensure_workers(self):
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._work()))
+
+    async def _work(self):
+        while True:
+            job = await self.backend.dequeue()
+            job.status = RUNNING
+            job.started_at = time.time()
+            self.running += 1
+            try:
+                await self.backend.save(job)
+                self._notify(job.id)
+                JOB_QUEUE_WAIT.observe(job.started_at - job.created_at)
+
+                job.result = await self.handler(job.params)
+                job.status = DONE
+                self.completed += 1
+            except Exception as e:
+                logger.exception(f"Job {job.id} failed")
+                record_error(e)
+                job.status = FAILED
+                job.error = "처리 중 문제가 발생했습니다. 다시 시도해주세요."
+                self.failed += 1
+            finally:
+                self.running -= 1
+                if not job.finished:
+                    # 워커가 취소됨 (종료 등): 실행 중 상태로 남지 않도록 실패로 기록
+                    logger.warning(f"Job {job.id} interrupted")
+                    job.status = FAILED
+                    job.error = "작업이 중단되었습니다. 다시 시도해주세요."
+                    self.failed += 1
+                job.finished_at = time.time()
+                await self.backend.save(job)
+                self._notify(job.id)
+                JOB_DURATION.observe(job.finished_at - job.started_at, outcome=job.status)
+
+    def _notify(self, job_id: str):
+        event = self._changes.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    @contextmanager
+    def subscribe(self, job_id: str) -> Iterator["JobSubscription"]:
+        """Watch one job for state changes made in this process"""
+        self._subscribers[job_id] = self._subscribers.get(job_id, 0) + 1
+        try:
+            yield JobSubscription(self, job_id)
+        finally:
+            # 마지막 구독자가 떠나면 이벤트도 제거 (끝나지 않은 작업의 항목이 쌓이지 않도록)
+            self._subscribers[job_id] -= 1
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+                self._changes.pop(job_id, None)
+
+    def _watch(self, job_id: str) -> asyncio.Event:
+        return self._changes.setdefault(job_id, asyncio.Event())
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.backend.depth(),
+            "workers": len(self._tasks),
+            "running": self.running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,164 @@
+"""
+Logging setup for the app and CLI tools.
+
+LOG_FORMAT=json switches to one JSON object per line. By default,
+records are handed to a QueueHandler and written by a background
+listener thread, so request handlers never block on log I/O. Large
+payloads (raw model responses) go through log_event(), which samples
+per event before any formatting; long fields are truncated by the
+formatters.
+
+    LOG_LEVEL=INFO
+    LOG_FORMAT=text|json
+    LOG_QUEUE=true
+    LOG_SAMPLE_RATES=combined_response=0.01,recommendations=0.1
+    LOG_MAX_FIELD_CHARS=2000
+"""
+import os
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Dict, Optional
+
+DEFAULT_SAMPLE_RATES = {
+    # 전체 응답 본문은 기본적으로 기록하지 않음 (파싱 실패 시에는 강제로 기록)
+    "combined_response": 0.0,
+    "recommendations": 0.0,
+}
+
+_sample_rates: Dict[str, float] = dict(DEFAULT_SAMPLE_RATES)
+_max_field_chars = 2000
+_listener: Optional[logging.handlers.QueueListener] = None
+_configured = False
+
+# LogRecord의 기본 속성; 나머지는 extra로 전달된 구조화 필드
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def truncate(value, limit: Optional[int] = None):
+    limit = _max_field_chars if limit is None else limit
+    if isinstance(value, str) and limit and len(value) > limit:
+        return f"{value[:limit]}... [truncated {len(value) - limit} chars]"
+    return value
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, object]:
+    return {
+        key: truncate(value) for key, value in vars(record).items()
+        if key not in _RESERVED_ATTRS and not key.startswith("_")
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; extra= fields become top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(record.getMessage()),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The default text format with structured fields appended as JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line = f"{line} {json.dumps(fields, ensure_ascii=False, default=str)}"
+        return line
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for a listener in the same process. The stock prepare()
+    formats the traceback into msg and drops exc_info, which would leave
+    JsonFormatter without an "exception" field; here only the arguments
+    are merged (they may change before the listener runs) and the
+    formatters see the original exc_info.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def should_sample(event: str) -> bool:
+    """Per-event sampling decision; events without a configured rate are always logged"""
+    rate = _sample_rates.get(event, 1.0)
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+def log_event(logger: logging.Logger, event: str, message: str, level: int = logging.INFO,
+              force: bool = False, **fields):
+    """
+    Log a structured event if it is sampled (or forced, e.g. on parse
+    failure). Nothing is formatted when the event is dropped.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if not force and not should_sample(event):
+        return
+    # 잘라내기는 리스너 스레드의 포매터에서 수행
+    logger.log(level, message, extra={"event": event, **fields})
+
+
+def configure_logging():
+    """Install the root handler once per process"""
+    global _sample_rates, _max_field_chars, _listener, _configured
+    if _configured:
+        return
+    _configured = True
+
+    _sample_rates = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+    _max_field_chars = int(os.getenv("LOG_MAX_FIELD_CHARS", "2000"))
+
+    handler = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter(logging.BASIC_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+
+    if os.getenv("LOG_QUEUE", "True").lower() == "true":
+        log_queue = queue.SimpleQueue()
+        root.addHandler(LocalQueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        root.addHandler(handler)
+
+
+def stop_logging():
+    """Drain queued records at interpreter exit"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
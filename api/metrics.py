@@ -0,0 +1,274 @@
+"""
+Minimal Prometheus-compatible metrics.
+
+Counters, gauges and histograms keep labelled samples in memory and are
+rendered in the Prometheus text exposition format by render(). Values
+owned by other components (cache counters) are read at scrape time
+through registered collectors.
+"""
+import time
+import bisect
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 8, 10, 15, 30)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """(sample name, labels, value) for every exported series"""
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        # collector -> (metric name, type, help); returns samples at scrape time
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Tuple[Dict[str, str], float]]]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name: str, type_name: str, documentation: str,
+                           collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        self._collectors.append((name, type_name, documentation, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for name, type_name, documentation, collect in self._collectors:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {type_name}")
+            for labels, value in collect():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "meditrek_http_requests_total", "HTTP requests by route and status",
+    ("method", "route", "status"),
+))
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "meditrek_http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route"),
+))
+HTTP_REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "meditrek_http_requests_in_flight", "HTTP requests currently being served",
+))
+UPSTREAM_REQUEST_DURATION = registry.register(Histogram(
+    "meditrek_upstream_request_duration_seconds", "Upstream API call latency",
+    ("upstream", "outcome"),
+))
+UPSTREAM_IN_FLIGHT = registry.register(Gauge(
+    "meditrek_upstream_requests_in_flight", "Upstream API calls currently open",
+    ("upstream",),
+))
+PARSE_DURATION = registry.register(Histogram(
+    "meditrek_parse_duration_seconds", "Time spent parsing Perplexity responses",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+))
+JOB_QUEUE_WAIT = registry.register(Histogram(
+    "meditrek_job_queue_wait_seconds", "Time background jobs spent queued before a worker took them",
+))
+JOB_DURATION = registry.register(Histogram(
+    "meditrek_job_duration_seconds", "Background job run time by outcome",
+    ("outcome",),
+))
+RATE_LIMITED = registry.register(Counter(
+    "meditrek_rate_limited_total", "Requests over a rate limit, by limiter and whether they were served from cache",
+    ("limiter", "outcome"),
+))
+ERRORS = registry.register(Counter(
+    "meditrek_errors_total", "Handled errors by exception type",
+    ("type",),
+))
+
+
+@contextmanager
+def observe_upstream(upstream: str):
+    """Time one upstream call; the outcome label is "error" if it raises, "cancelled" if cancelled"""
+    start = time.perf_counter()
+    outcome = "ok"
+    UPSTREAM_IN_FLIGHT.inc(upstream=upstream)
+    try:
+        yield
+    except asyncio.CancelledError:
+        # 헤징에서 진 요청 등 호출자가 취소한 경우
+        outcome = "cancelled"
+        raise
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(upstream=upstream)
+        UPSTREAM_REQUEST_DURATION.observe(time.perf_counter() - start, upstream=upstream, outcome=outcome)
+
+
+def record_error(exc: BaseException):
+    ERRORS.inc(type=type(exc).__name__)
+
+
+_cache_sources: List[Tuple[str, Callable[[], Dict[str, object]]]] = []
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, object]]):
+    """Expose a cache's stats() counters at scrape time"""
+    _cache_sources.append((name, stats))
+
+
+def _cache_samples(field: str):
+    def collect():
+        for name, stats in _cache_sources:
+            value = stats().get(field)
+            if value is not None:
+                yield {"cache": name}, value
+    return collect
+
+
+for _field, _type, _help in (
+    ("hits", "counter", "Cache lookups that found a live entry"),
+    ("stale_hits", "counter", "Lookups served from an expired entry within its grace window"),
+    ("misses", "counter", "Cache lookups that found nothing"),
+    ("evictions", "counter", "Entries evicted to stay within cache limits"),
+    ("expirations", "counter", "Entries removed after their TTL"),
+    ("entries", "gauge", "Entries currently cached"),
+    ("hit_ratio", "gauge", "Cache hits divided by lookups"),
+):
+    registry.register_collector(f"meditrek_cache_{_field}" + ("_total" if _type == "counter" else ""),
+                                _type, _help, _cache_samples(_field))
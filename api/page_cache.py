@@ -0,0 +1,28 @@
+"""
+Rendered-page cache for templates whose output depends only on a small,
+fixed context (the landing page and the empty form).
+"""
+from typing import Any, Dict, Tuple
+
+from jinja2 import Environment
+
+from .static_assets import CompressedBody
+
+
+class PageCache:
+    """Render each (template, context) once and keep the bytes, ETag and gzip/brotli variants"""
+
+    def __init__(self, environment: Environment):
+        self._environment = environment
+        self._pages: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], CompressedBody] = {}
+
+    def get(self, name: str, **context: Any) -> CompressedBody:
+        key = (name, tuple(sorted(context.items())))
+        page = self._pages.get(key)
+        if page is None:
+            html = self._environment.get_template(name).render(**context)
+            page = self._pages[key] = CompressedBody(html.encode("utf-8"), "text/html; charset=utf-8")
+        return page
+
+    def clear(self):
+        self._pages.clear()
@@ -1,20 +1,48 @@
 import os
-import requests
+import httpx
+import asyncio
 import json
-import re
 import time
-from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from functools import lru_cache
 import logging
 
-# Load environment variables
-load_dotenv()
+from .http_client import get_http_client
+from .cache import CacheBackend, get_recommendation_cache
+from .cache_keys import SymptomProfile
+from .similarity import SimilarityIndex, get_similarity_index
+from .singleflight import Broadcast, SingleFlight
+from .rate_limit import RateLimitedError, admit_upstream_call, note_served_from_cache
+from .metrics import PARSE_DURATION, observe_upstream, record_error
+from .logging_config import log_event
+from .recommendation_codec import Recommendations, decode_recommendations, encode_recommendations
+from .resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    RetryPolicy,
+    hedged,
+    is_retryable,
+)
+from .response_parser import (
+    Event,
+    RecommendationParser,
+    collect,
+    create_pharmacy_links,
+    parse_combined_response,
+    parse_text,
+)
+
 logger = logging.getLogger(__name__)
 
+# 헤징은 지연 분포가 어느 정도 쌓인 뒤에만 사용 (p95 기준)
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.5
+
 # 의존성 주입을 위한 함수
+@lru_cache(maxsize=None)
 def get_perplexity_service():
-    """Dependency injection provider for PerplexityService"""
+    """Dependency injection provider for PerplexityService (one per process)"""
     return PerplexityService()
 
 class PerplexityAPIError(Exception):
@@ -30,45 +58,100 @@ class PerplexityService:
     Perplexity API service for medication recommendations
     """
     
-    def __init__(self):
+    def __init__(self, cache: Optional[CacheBackend] = None, similarity: Optional[SimilarityIndex] = None):
         self.api_key = os.getenv("PERPLEXITY_API_KEY")
-        self.api_url = "https://api.perplexity.ai"
+        self.api_url = os.getenv("PERPLEXITY_API_URL", "https://api.perplexity.ai")
         self.last_response = None
-        self._cache = {}
-        self._cache_timeout = 3600  # 1시간 캐시
+        # 요청 간에 공유되는 LRU+TTL 캐시
+        self._cache = cache if cache is not None else get_recommendation_cache()
+        self._inflight = SingleFlight()
+        # 스트리밍 중인 캐시 키 -> 지금까지 파싱된 이벤트 (같은 요청이 합류해 이어 받음)
+        self._streams: Dict[str, Broadcast] = {}
+        # 유사 증상 조합 매칭 (SEMANTIC_CACHE=true일 때만)
+        self._similar = similarity if similarity is not None else get_similarity_index()
+        # 백그라운드 갱신 중인 캐시 키 -> task
+        self._refreshing: Dict[str, "asyncio.Task"] = {}
+        self._retry = RetryPolicy.from_env("PERPLEXITY")
+        self._breaker = CircuitBreaker.from_env("PERPLEXITY")
+        self._latency = LatencyTracker()
+        self._hedging = os.getenv("PERPLEXITY_HEDGING", "False").lower() == "true"
+        # 재시도를 포함한 한 질의의 전체 시간 한도 (Vercel 함수 제한 10초 이내)
+        self._deadline = float(os.getenv("PERPLEXITY_DEADLINE", "9"))
         
         if not self.api_key:
             logger.warning("Perplexity API key not found in environment variables")
     
-    def _get_cache_key(self, query: str) -> str:
-        """Generate cache key"""
-        return f"query_{hash(query)}"
-
-    def _get_cached_response(self, cache_key: str) -> Optional[str]:
-        """Get cached response"""
-        if cache_key in self._cache:
-            timestamp, response = self._cache[cache_key]
-            if time.time() - timestamp < self._cache_timeout:
-                logger.info("Using cached response")
-                return response
-            else:
-                del self._cache[cache_key]
-        return None
+    def _get_cached_result(self, cache_key: str) -> Tuple[Optional[Recommendations], bool]:
+        """Get cached parsed result and whether it is past its TTL (within the grace window)"""
+        found = self._cache.get_stale(cache_key)
+        if found is None:
+            return None, False
+        packed, stale = found
+        try:
+            result = decode_recommendations(packed)
+        except ValueError as e:
+            logger.warning(f"Dropping unreadable cache entry: {e}")
+            self._cache.delete(cache_key)
+            return None, False
+        logger.debug("Using cached response")
+        return result, stale
 
-    def _cache_response(self, cache_key: str, response: str):
-        """Cache response"""
-        self._cache[cache_key] = (time.time(), response)
+    def _refresh_in_background(self, cache_key: str, query: str):
+        """Re-fetch a stale entry once, however many requests hit it meanwhile"""
+        if cache_key in self._refreshing:
+            return
+        try:
+            # 갱신은 클라이언트 한도와 무관하지만 전체 업스트림 한도는 따름
+            admit_upstream_call("perplexity", charge_client=False)
+        except RateLimitedError:
+            logger.info("Skipping stale entry refresh: Perplexity rate limit reached")
+            return
+        task = asyncio.create_task(self._inflight.do(cache_key, lambda: self._fetch_combined(query, cache_key)))
+        self._refreshing[cache_key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(cache_key, None))
 
-    def query_perplexity(self, query: str, max_retries: int = 1, timeout: int = 8) -> Optional[str]:
-        """Send a query to the Perplexity API using requests."""
-        start_time = time.time()
-        logger.info(f"Starting API request for query: {query[:100]}...")
+    def _cache_result(self, cache_key: str, medications: List[Dict[str, Any]], management_lists: Dict[str, List[str]]):
+        """Cache the parsed result; unparseable responses are not cached"""
+        if medications:
+            self._cache.set(cache_key, encode_recommendations(medications, management_lists))
 
-        headers = {
+    def _remember(self, profile: SymptomProfile, cache_key: str):
+        if self._similar is not None:
+            self._similar.add(profile, cache_key)
+
+    def _near_duplicate(self, profile: SymptomProfile) -> Optional[Recommendations]:
+        """Fresh cached result for a similar profile covering all of this request's symptoms"""
+        if self._similar is None:
+            return None
+        match = self._similar.nearest(profile)
+        if match is None:
+            return None
+        result, stale = self._get_cached_result(match.cache_key)
+        if result is None:
+            # 캐시에서 이미 밀려난 항목
+            self._similar.discard(match.cache_key)
+            return None
+        if stale:
+            # 만료된 항목은 원래 질의로만 갱신되므로 유사 매칭에는 쓰지 않음
+            return None
+        log_event(logger, "semantic_cache_hit", "Serving a near-duplicate cached result",
+                  level=logging.DEBUG, score=round(match.score, 3))
+        return result
+
+    def similarity_stats(self) -> Optional[Dict[str, Any]]:
+        return self._similar.stats() if self._similar is not None else None
+
+    def inflight_stats(self) -> Dict[str, int]:
+        """Counters for coalesced upstream calls"""
+        return self._inflight.stats()
+
+    def _request_headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        
+
+    def _build_payload(self, query: str, stream: bool = False) -> Dict[str, Any]:
         # 쿼리 길이 제한
         if len(query) > 1000:
             query = query[:1000] + "..."
@@ -82,54 +165,143 @@ class PerplexityService:
                 }
             ]
         }
-        
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Observed p95 latency, once enough samples exist; None disables hedging"""
+        if not self._hedging or len(self._latency) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY, self._latency.percentile(0.95))
+
+    def _admit_extra_attempt(self) -> bool:
+        """Charge a hedge or retry to the upstream limiter; False if it has no token left"""
         try:
-            request_start = time.time()
-            logger.info("Sending query to Perplexity API")
-            
-            response = requests.post(
+            admit_upstream_call("perplexity", charge_client=False)
+        except RateLimitedError:
+            return False
+        return True
+
+    def _record_failure(self, exc: Exception, probe: bool):
+        # 업스트림 장애(시간 초과, 5xx, 429)만 실패로 집계하고, 4xx·응답 형식 오류는 결과 없이 탐색 슬롯만 반환
+        if is_retryable(exc):
+            self._breaker.record_failure()
+        elif probe:
+            self._breaker.release_probe()
+
+    async def _post_completion(self, payload: Dict[str, Any], timeout: float) -> str:
+        with observe_upstream("perplexity"):
+            response = await get_http_client().post(
                 f"{self.api_url}/chat/completions", 
-                headers=headers, 
+                headers=self._request_headers(), 
                 json=payload,
                 timeout=timeout
             )
             response.raise_for_status()
-            
-            # Extract the response text
-            data = response.json()
-            response_text = data["choices"][0]["message"]["content"]
-            
+        data = response.json()
+        return data["choices"][0]["message"]["content"]
+
+    async def _attempt(self, payload: Dict[str, Any], timeout: float) -> str:
+        """One (possibly hedged) call bounded by `timeout` in total, not per network read"""
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or hedge_delay >= timeout:
+            call = self._post_completion(payload, timeout)
+        else:
+            call = hedged(lambda: self._post_completion(payload, timeout), hedge_delay, self._admit_extra_attempt)
+        try:
+            return await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            raise httpx.TimeoutException(f"No response within {timeout:.1f}s")
+
+    async def query_perplexity(self, query: str, max_retries: Optional[int] = None, timeout: float = 8,
+                               deadline: Optional[float] = None) -> Optional[str]:
+        """
+        Send a query to the Perplexity API without blocking the event loop.
+
+        Retryable failures are retried with jittered backoff, slow calls
+        may be hedged, and while the circuit breaker is open the call
+        fails fast. All attempts share one `deadline` (PERPLEXITY_DEADLINE
+        seconds by default); each attempt gets at most `timeout` of what
+        is left. Hedges and retries are charged to the upstream rate
+        limiter and skipped when it has no token. Returns None when no
+        response could be obtained.
+        """
+        start_time = time.time()
+        logger.debug("Starting API request for query: %.100s...", query)
+
+        payload = self._build_payload(query)
+        max_retries = self._retry.max_retries if max_retries is None else max_retries
+        deadline_at = time.monotonic() + (self._deadline if deadline is None else deadline)
+
+        for attempt in range(max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                logger.error("Perplexity request deadline exceeded")
+                return None
+            if not self._breaker.allow_request():
+                logger.warning("Perplexity circuit breaker is open; failing fast")
+                record_error(CircuitOpenError())
+                return None
+
+            probe = self._breaker.state == CircuitBreaker.HALF_OPEN
+            request_start = time.time()
+            try:
+                response_text = await self._attempt(payload, min(timeout, remaining))
+            except asyncio.CancelledError:
+                # 취소된 탐색 요청은 결과 없이 슬롯만 반환
+                if probe:
+                    self._breaker.release_probe()
+                raise
+            except Exception as e:
+                self._record_failure(e, probe)
+                record_error(e)
+                if isinstance(e, httpx.TimeoutException):
+                    logger.error(f"API request timed out: {e}")
+                elif isinstance(e, httpx.HTTPStatusError):
+                    logger.error(f"HTTP Error: {e}")
+                elif isinstance(e, httpx.TransportError):
+                    logger.error(f"Connection error: {e}")
+                else:
+                    logger.error(f"Unexpected Error: {e}")
+                if attempt < max_retries and is_retryable(e):
+                    backoff = self._retry.delay(attempt)
+                    remaining = deadline_at - time.monotonic() - backoff
+                    # 느린 업스트림은 남은 시간이 한 번의 시도에 못 미치면 다시 시도해도 시간 초과
+                    if (remaining > 0 and not (isinstance(e, httpx.TimeoutException) and remaining < timeout)
+                            and self._admit_extra_attempt()):
+                        await asyncio.sleep(backoff)
+                        continue
+                return None
+
+            request_time = time.time() - request_start
+            self._breaker.record_success()
+            self._latency.record(request_time)
+
             # Store the last response for debugging
             self.last_response = response_text
-            request_time = time.time() - request_start
-            total_time = time.time() - start_time
-            
-            logger.info(f"API Response Time: {request_time:.2f}s")
-            logger.info(f"Total Processing Time: {total_time:.2f}s")
-            logger.info(f"Response length: {len(response_text)} characters")
-            
+            log_event(
+                logger, "perplexity_response", "Perplexity response received",
+                request_time=round(request_time, 3),
+                total_time=round(time.time() - start_time, 3),
+                response_chars=len(response_text),
+                attempts=attempt + 1,
+            )
             return response_text
-            
-        except requests.exceptions.Timeout as e:
-            logger.error(f"API request timed out: {e}")
-            return None
-            
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP Error: {e}")
-            return None
-            
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"Connection error: {e}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Unexpected Error: {e}")
-            return None
-    
-    def get_combined_recommendations(self, symptoms: List[str], gender: str, age: str, allergic: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
-        """Get both medication recommendations and management lists in a single API call."""
+        return None
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        return {
+            "breaker": self._breaker.stats(),
+            "hedging": self._hedging,
+            "hedge_delay": self._hedge_delay(),
+            "latency_samples": len(self._latency),
+        }
+
+    def _build_combined_query(self, symptoms: List[str], gender: str, age: str, allergic: str) -> str:
+        """Prompt asking for medications and management lists in a fixed format."""
         symptoms_text = ", ".join(symptoms)
-        query = (
+        return (
             f"As a medical professional, provide recommendations for a {age} year old {gender} "
             f"with allergies to {allergic} who has the following symptoms: {symptoms_text}.\n\n"
             f"Format your response EXACTLY as follows:\n\n"
@@ -153,186 +325,270 @@ class PerplexityService:
             f"2. [action]\n"
             f"3. [action]"
         )
+
+    async def get_combined_recommendations(self, symptoms: List[str], gender: str, age: str, allergic: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+        """Get both medication recommendations and management lists in a single API call."""
+        medications, management_lists, _ = await self.get_recommendations(symptoms, gender, age, allergic)
+        return medications, management_lists
+
+    async def get_recommendations(self, symptoms: List[str], gender: str, age: str, allergic: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]], bool]:
+        """
+        Like get_combined_recommendations, plus whether the result is stale.
+
+        An expired entry within the grace window is returned immediately
+        and refreshed in the background; if the refresh fails (upstream
+        down), the stale entry keeps being served.
+        """
+        cached = self.cached_recommendations(symptoms, gender, age, allergic)
+        if cached is not None:
+            return cached
+        medications, management_lists = await self.fetch_recommendations(symptoms, gender, age, allergic)
+        return medications, management_lists, False
+
+    def cached_recommendations(self, symptoms: List[str], gender: str, age: str, allergic: str) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, List[str]], bool]]:
+        """
+        The cached (or near-duplicate) result and whether it is stale, or
+        None on a miss. Never waits for the upstream; a stale entry is
+        refreshed in the background.
+        """
+        # 캐시 키 생성 및 확인 (증상 순서/대소문자/공백과 무관한 키)
+        profile = SymptomProfile.from_request(symptoms, gender, age, allergic)
+        cache_key = profile.cache_key
+        cached_result, stale = self._get_cached_result(cache_key)
+        if cached_result:
+            if stale:
+                self._refresh_in_background(cache_key, self._build_combined_query(symptoms, gender, age, allergic))
+            self._remember(profile, cache_key)
+            note_served_from_cache()
+            medications, management_lists = cached_result
+            return medications, management_lists, stale
+
+        near_result = self._near_duplicate(profile)
+        if near_result:
+            note_served_from_cache()
+            medications, management_lists = near_result
+            return medications, management_lists, False
+        return None
+
+    async def fetch_recommendations(self, symptoms: List[str], gender: str, age: str, allergic: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+        """Query the upstream after a cache miss (joining an identical call in flight) and cache the result"""
+        query = self._build_combined_query(symptoms, gender, age, allergic)
+        profile = SymptomProfile.from_request(symptoms, gender, age, allergic)
+        cache_key = profile.cache_key
+
+        # 진행 중인 호출에 합류하는 경우는 새 업스트림 호출이 아니므로 한도와 무관
+        if not self._inflight.running(cache_key):
+            admit_upstream_call("perplexity")
         
-        logger.info(f"=== Combined Recommendations API Call ===")
-        logger.info(f"Starting combined query for symptoms: {symptoms_text}")
-        
-        # 캐시 키 생성 및 확인
-        cache_key = self._get_cache_key(query)
-        cached_response = self._get_cached_response(cache_key)
-        if cached_response:
-            logger.info("Using cached combined response")
-            return self._parse_combined_response(cached_response)
-        
-        start_time = time.time()
-        response_text = self.query_perplexity(query)  # 기본 타임아웃 설정 사용
-        total_time = time.time() - start_time
-        
-        logger.info(f"Combined API Total Time: {total_time:.2f}s")
-        logger.info(f"=== Combined API Call End ===")
+        # 동일한 쿼리가 이미 진행 중이면 그 결과를 함께 기다림
+        medications, management_lists = await self._inflight.do(cache_key, lambda: self._fetch_combined(query, cache_key))
+        if medications:
+            self._remember(profile, cache_key)
+        return medications, management_lists
+
+    async def _fetch_combined(self, query: str, cache_key: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+        """Query Perplexity on a cache miss, parse the response and cache the result."""
+        response_text = await self.query_perplexity(query)  # 기본 타임아웃 설정 사용
         
         if not response_text:
             logger.error("No response received from Perplexity API")
             return [], {"to_do_list": [], "do_not_list": []}
             
-        # 응답 캐시에 저장
-        self._cache_response(cache_key, response_text)
-        logger.info(f"Received combined response: {response_text}")
-        return self._parse_combined_response(response_text)
+        log_event(logger, "combined_response", "Received combined response", body=response_text)
+        medications, management_lists = self._parse_combined_response(response_text)
+        # 파싱된 결과를 캐시에 저장
+        self._cache_result(cache_key, medications, management_lists)
+        return medications, management_lists
         
+    async def stream_perplexity(self, query: str, timeout: int = 8) -> AsyncIterator[str]:
+        """
+        Yield content deltas from a streamed (SSE) Perplexity completion.
+
+        Retryable failures are retried only until the first delta has been
+        yielded; raises CircuitOpenError while the breaker is open.
+        """
+        logger.debug("Sending streaming query to Perplexity API")
+        payload = self._build_payload(query, stream=True)
+        for attempt in range(self._retry.max_retries + 1):
+            if not self._breaker.allow_request():
+                raise CircuitOpenError("Perplexity circuit breaker is open")
+            probe = self._breaker.state == CircuitBreaker.HALF_OPEN
+            received = False
+            try:
+                with observe_upstream("perplexity"):
+                    async with get_http_client().stream(
+                        "POST",
+                        f"{self.api_url}/chat/completions",
+                        headers=self._request_headers(),
+                        json=payload,
+                        timeout=timeout
+                    ) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            choice = json.loads(data)["choices"][0]
+                            delta = choice.get("delta", {}).get("content")
+                            if delta:
+                                received = True
+                                yield delta
+            except (asyncio.CancelledError, GeneratorExit):
+                # 취소되거나 소비자가 중단한 스트림은 결과 없이 탐색 슬롯만 반환
+                if probe:
+                    self._breaker.release_probe()
+                raise
+            except Exception as e:
+                self._record_failure(e, probe)
+                if (not received and attempt < self._retry.max_retries and is_retryable(e)
+                        and self._admit_extra_attempt()):
+                    logger.warning(f"Streaming request failed, retrying: {e}")
+                    await asyncio.sleep(self._retry.delay(attempt))
+                    continue
+                raise
+            self._breaker.record_success()
+            return
+
+    def stream_combined_recommendations(self, symptoms: List[str], gender: str, age: str, allergic: str) -> AsyncIterator[Event]:
+        """
+        Events ("medication", dict), ("do", str) and ("dont", str), each
+        yielded as soon as the item is complete. Cached responses (fresh,
+        within the grace window, or a near duplicate) are replayed
+        immediately, preceded by ("stale", True) when the entry is past its
+        TTL and being refreshed.
+
+        Identical requests share one upstream call: a request arriving
+        while the same profile is being streamed receives the events parsed
+        so far and then the rest as they arrive; one arriving during a
+        non-streamed call waits for its result.
+
+        Raises RateLimitedError right away, before any event, when nothing
+        is cached and a new upstream call is not admitted.
+        """
+        cached = self.cached_recommendations(symptoms, gender, age, allergic)
+        if cached is not None:
+            medications, management_lists, stale = cached
+            events = self._replay((medications, management_lists))
+            return self._yield_all([("stale", True)] + events if stale else events)
+
+        query = self._build_combined_query(symptoms, gender, age, allergic)
+        profile = SymptomProfile.from_request(symptoms, gender, age, allergic)
+        cache_key = profile.cache_key
+        broadcast = self._streams.get(cache_key)
+        if broadcast is None and self._inflight.running(cache_key):
+            # 일반 조회가 진행 중이면 그 결과를 기다렸다가 재생
+            return self._replay_when_done(self._inflight.start(cache_key, lambda: self._fetch_combined(query, cache_key)))
+
+        if broadcast is None:
+            # 진행 중인 호출에 합류하는 경우는 새 업스트림 호출이 아니므로 한도와 무관
+            admit_upstream_call("perplexity")
+            broadcast = Broadcast()
+            self._streams[cache_key] = broadcast
+        # 소비자가 연결을 끊어도 공유 호출은 끝까지 진행되어 결과가 캐시됨
+        task = self._inflight.start(cache_key, lambda: self._stream_combined(query, cache_key, profile, broadcast))
+        return self._follow(broadcast, task)
+
+    @staticmethod
+    async def _yield_all(events: List[Event]) -> AsyncIterator[Event]:
+        for event in events:
+            yield event
+
+    async def _replay_when_done(self, task: "asyncio.Task") -> AsyncIterator[Event]:
+        for event in self._replay(await asyncio.shield(task)):
+            yield event
+
+    @staticmethod
+    async def _follow(broadcast: Broadcast, task: "asyncio.Task") -> AsyncIterator[Event]:
+        async for event in broadcast.replay():
+            yield event
+        await asyncio.shield(task)
+
+    @staticmethod
+    def _replay(result: Recommendations) -> List[Event]:
+        medications, management_lists = result
+        events: List[Event] = [("medication", medication) for medication in medications]
+        events.extend(("do", item) for item in management_lists["to_do_list"])
+        events.extend(("dont", item) for item in management_lists["do_not_list"])
+        return events
+
+    async def _stream_combined(self, query: str, cache_key: str, profile: SymptomProfile,
+                               broadcast: Broadcast) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+        """Stream one upstream completion into `broadcast`, then cache and return the parsed result"""
+        parser = RecommendationParser()
+        chunks = []
+        emitted: List[Event] = []
+        start_time = time.time()
+        # 청크 사이의 네트워크 대기 시간은 빼고 파싱에 쓴 시간만 합산
+        parse_time = 0.0
+        try:
+            try:
+                async for delta in self.stream_perplexity(query):
+                    chunks.append(delta)
+                    parse_start = time.perf_counter()
+                    events = parser.feed(delta)
+                    parse_time += time.perf_counter() - parse_start
+                    emitted.extend(events)
+                    broadcast.publish(events)
+            except (httpx.HTTPError, CircuitOpenError, ValueError, KeyError) as e:
+                # 부분 응답은 캐시하지 않음
+                logger.error(f"Streaming request failed: {e}")
+                record_error(e)
+                broadcast.publish(parser.close())
+                return [], {"to_do_list": [], "do_not_list": []}
+
+            parse_start = time.perf_counter()
+            events = parser.close()
+            PARSE_DURATION.observe(parse_time + time.perf_counter() - parse_start)
+            emitted.extend(events)
+            broadcast.publish(events)
+        finally:
+            broadcast.close()
+            self._streams.pop(cache_key, None)
+
+        response_text = "".join(chunks)
+        log_event(
+            logger, "perplexity_stream", "Streamed Perplexity response received",
+            total_time=round(time.time() - start_time, 3),
+            response_chars=len(response_text),
+        )
+        log_event(logger, "combined_response", "Received combined response", body=response_text)
+        medications, management_lists = collect(emitted)
+        if response_text:
+            self.last_response = response_text
+            self._cache_result(cache_key, medications, management_lists)
+            if medications:
+                self._remember(profile, cache_key)
+        return medications, management_lists
+
     def _parse_combined_response(self, response_text: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
         """Parse the combined response into medications and management lists."""
         try:
-            logger.info("Starting to parse combined response...")
-            
-            # Split response into medications and management sections
-            sections = response_text.split("MANAGEMENT:")
-            if len(sections) != 2:
-                logger.error("Could not split response into medications and management sections")
-                return [], {"to_do_list": [], "do_not_list": []}
-                
-            medications_text, management_text = sections
-            
-            # Parse medications
-            medications = self.parse_medication_recommendations(medications_text.replace("MEDICATIONS:", "").strip())
-            
-            # Parse management lists
-            management_lists = self.parse_management_lists(management_text.strip())
-            
-            return medications, management_lists
-            
+            with PARSE_DURATION.time():
+                medications, management_lists = parse_combined_response(response_text)
         except Exception as e:
             logger.exception(f"Error parsing combined response: {e}")
+            record_error(e)
+            log_event(logger, "parse_failure", "Unparseable combined response",
+                      level=logging.ERROR, force=True, body=response_text)
             return [], {"to_do_list": [], "do_not_list": []}
+        if not medications:
+            # 파싱 실패 시에는 샘플링과 무관하게 원문을 남김
+            log_event(logger, "parse_failure", "No medications parsed from combined response",
+                      level=logging.WARNING, force=True, body=response_text)
+        return medications, management_lists
     
     def parse_medication_recommendations(self, response_text: str) -> List[Dict[str, Any]]:
         """Extract medication recommendations from Perplexity response."""
-        medications = []
-        try:
-            # Remove ** characters from the response
-            cleaned_text = response_text.replace('*', '')
-            
-            # Split recommendations by numbered items
-            medication_sections = re.split(r'\n\s*\d+\.\s*', cleaned_text)
-            medication_sections = [s.strip() for s in medication_sections if s.strip()]
-            rank = 1
-
-            for section in medication_sections[:3]:  # Process max 3 items
-                if not section.strip() or "none recommended" in section.lower():
-                    continue
-
-                medication_info = {
-                    "rank": rank,
-                    "name": None,
-                    "medication_type": None,
-                    "side_effects": "Not available",
-                }
-
-                # Extract brand name with generic name in parentheses
-                name_match = re.search(r'brand name:?\s*([^:\n]+)', section, re.IGNORECASE)
-                if name_match:
-                    name = name_match.group(1).strip()
-                    medication_info["name"] = name
-
-                # Extract medication form
-                form_match = re.search(r'form:?\s*([^:\n]+)', section, re.IGNORECASE)
-                if form_match:
-                    medication_form = form_match.group(1).strip()
-                    medication_info["medication_type"] = medication_form
-
-                # Extract side effects
-                side_effects_match = re.search(r'side effects:?\s*([^\n]+(?:\n\s+[^\n]+)*)', section, re.IGNORECASE)
-                if side_effects_match:
-                    side_effects = side_effects_match.group(1).strip()
-                    medication_info["side_effects"] = side_effects
-
-                # Add medication if name is present
-                if medication_info["name"]:
-                    pharmacy_links = self.create_pharmacy_links(medication_info["name"])
-                    medication_info.update(pharmacy_links)
-                    medications.append(medication_info)
-                    rank += 1
-                else:
-                    logger.warning(f"Skipping medication due to missing name: {section}")
-
-            if not medications:
-                logger.error(f"No medications found in response: {cleaned_text}")
-
-            return medications
-        except Exception as e:
-            logger.exception(f"Error parsing medication recommendations: {e}, response_text: {response_text}")
-            return []
+        medications, _ = parse_text(response_text, RecommendationParser.MEDICATIONS)
+        return medications
         
     def create_pharmacy_links(self, medication_name):
         """Create pharmacy links for a medication"""
-        # Clean up the medication name for search
-        search_term = re.sub(r'\([^)]*\)', '', medication_name).strip()
-        # Remove brand designations like "Extra Strength"
-        search_term = re.sub(r'(?:extra strength|maximum strength|children\'s|infant\'s)', '', search_term, flags=re.IGNORECASE).strip()
-        encoded_search = requests.utils.quote(search_term)
-        
-        return {
-            "cvs_link": f"https://www.cvs.com/search?searchTerm={encoded_search}",
-            #"walgreens_link": f"https://www.walgreens.com/search/results.jsp?Ntt={encoded_search}",
-        }
+        return create_pharmacy_links(medication_name)
 
     def parse_management_lists(self, response_text: str) -> Dict[str, List[str]]:
         """Parse the response text into to-do list and do-not list."""
-        result = {
-            "to_do_list": [],
-            "do_not_list": []
-        }
-        
-        try:
-            # Remove ** characters from the response
-            cleaned_text = response_text.replace('*', '')
-            logger.info(f"Cleaned response text: {cleaned_text}")
-
-            # First try to find DO section with more flexible pattern
-            do_match = re.search(r'DO:[\s\n]*((?:\d+\.[^\n]+\n?)+)', cleaned_text, re.IGNORECASE)
-            if do_match:
-                do_section = do_match.group(1)
-                logger.info(f"Found DO section: {do_section}")
-                do_items = re.findall(r'\d+\.\s*([^\n]+)', do_section)
-                logger.info(f"Extracted DO items: {do_items}")
-                
-                # Clean up items and limit to 3
-                cleaned_items = []
-                for item in do_items[:3]:
-                    if item.strip():
-                        # Remove reference numbers and special characters
-                        item = re.sub(r'\[\d+\](?:\[\d+\])*', '', item)
-                        item = re.sub(r'[^\w\s.,()-]', '', item)
-                        cleaned_items.append(item.strip())
-                result["to_do_list"] = cleaned_items
-                logger.info(f"Final DO items: {result['to_do_list']}")
-            else:
-                logger.warning("Could not find DO section in response")
-
-            # Then try to find DON'T section with more flexible pattern
-            dont_match = re.search(r"DON'?T:[\s\n]*((?:\d+\.[^\n]+\n?)+)", cleaned_text, re.IGNORECASE)
-            if dont_match:
-                dont_section = dont_match.group(1)
-                logger.info(f"Found DON'T section: {dont_section}")
-                dont_items = re.findall(r'\d+\.\s*([^\n]+)', dont_section)
-                logger.info(f"Extracted DON'T items: {dont_items}")
-                
-                # Clean up items and limit to 3
-                cleaned_items = []
-                for item in dont_items[:3]:
-                    if item.strip():
-                        # Remove reference numbers and special characters
-                        item = re.sub(r'\[\d+\](?:\[\d+\])*', '', item)
-                        item = re.sub(r'[^\w\s.,()-]', '', item)
-                        cleaned_items.append(item.strip())
-                result["do_not_list"] = cleaned_items
-                logger.info(f"Final DON'T items: {result['do_not_list']}")
-            else:
-                logger.warning("Could not find DON'T section in response")
-
-            return result
-            
-        except Exception as e:
-            logger.exception(f"Error parsing management lists: {e}")
-            logger.error(f"Failed response text: {response_text}")
-            return result
\ No newline at end of file
+        _, management_lists = parse_text(response_text, RecommendationParser.MANAGEMENT)
+        return management_lists
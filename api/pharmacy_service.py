@@ -0,0 +1,259 @@
+import os
+import json
+import math
+import logging
+import tempfile
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache import CacheBackend, SQLiteCache, TTLCache
+from .http_client import get_http_client
+from .metrics import observe_upstream
+from .rate_limit import admit_upstream_call, note_served_from_cache
+from .zip_index import ZipCentroidIndex, get_zip_index
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_MAPS_API_URL = os.getenv("GOOGLE_MAPS_API_URL", "https://maps.googleapis.com/maps/api")
+SEARCH_RADIUS_METERS = 5000
+# 좌표를 소수점 3자리(약 110m)로 반올림해 인접한 요청이 같은 캐시 항목을 공유
+COORDINATE_PRECISION = 3
+EARTH_RADIUS_MILES = 3958.8
+MAX_PAGE_SIZE = 20
+
+
+# 의존성 주입을 위한 함수
+@lru_cache(maxsize=None)
+def get_pharmacy_service():
+    """Dependency injection provider for PharmacyService (one per process)"""
+    return PharmacyService()
+
+
+def distances_miles(lat: float, lng: float, points: List[Tuple[float, float]]) -> List[float]:
+    """Great-circle (haversine) distance from (lat, lng) to each point, in miles"""
+    # 기준점 관련 값은 한 번만 계산
+    origin_lat = math.radians(lat)
+    origin_lng = math.radians(lng)
+    cos_origin = math.cos(origin_lat)
+    distances = []
+    for point_lat, point_lng in points:
+        phi = math.radians(point_lat)
+        half_dlat = (phi - origin_lat) / 2
+        half_dlng = (math.radians(point_lng) - origin_lng) / 2
+        h = math.sin(half_dlat) ** 2 + cos_origin * math.cos(phi) * math.sin(half_dlng) ** 2
+        distances.append(2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(h))))
+    return distances
+
+
+def rank_by_distance(places: List[Dict[str, Any]], lat: float, lng: float) -> List[Tuple[Optional[float], Dict[str, Any]]]:
+    """(distance in miles, place) nearest first; places without coordinates go last"""
+    located = [place for place in places if place.get("location")]
+    distances = distances_miles(lat, lng, [(p["location"]["lat"], p["location"]["lng"]) for p in located])
+    ranked: List[Tuple[Optional[float], Dict[str, Any]]] = sorted(
+        zip(distances, located), key=lambda pair: pair[0]
+    )
+    ranked.extend((None, place) for place in places if not place.get("location"))
+    return ranked
+
+
+def format_distance(miles: Optional[float]) -> str:
+    if miles is None:
+        return "Nearby"
+    return f"{miles:.1f} mi" if miles >= 0.1 else "< 0.1 mi"
+
+
+class PharmacyLookupError(Exception):
+    """Google Geocoding/Places 조회 중 발생하는 오류"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def _create_geocode_cache() -> CacheBackend:
+    """ZIP -> coordinates never changes, so this tier is effectively permanent"""
+    max_entries = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "50000"))
+    ttl = float(os.getenv("GEOCODE_CACHE_TTL", str(365 * 24 * 3600)))
+    if os.getenv("GEOCODE_CACHE_BACKEND", "memory").lower() == "sqlite":
+        path = os.getenv(
+            "GEOCODE_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "meditrek_geocode.sqlite3"),
+        )
+        return SQLiteCache(path, max_entries=max_entries, ttl=ttl)
+    return TTLCache(max_entries=max_entries, max_bytes=8 * 1024 * 1024, ttl=ttl)
+
+
+def _create_pharmacy_cache() -> CacheBackend:
+    return TTLCache(
+        max_entries=int(os.getenv("PHARMACY_CACHE_MAX_ENTRIES", "5000")),
+        max_bytes=int(os.getenv("PHARMACY_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        ttl=float(os.getenv("PHARMACY_CACHE_TTL", str(6 * 3600))),
+    )
+
+
+class PharmacyService:
+    """
+    Nearby pharmacy lookup via Google Geocoding and Places Nearby Search
+    """
+
+    def __init__(self, geocode_cache: Optional[CacheBackend] = None,
+                 pharmacy_cache: Optional[CacheBackend] = None,
+                 zip_index: Optional[ZipCentroidIndex] = None):
+        self.api_key = os.getenv("GOOGLE_PLACES_API_KEY")
+        self.api_url = GOOGLE_MAPS_API_URL
+        self._geocode_cache = geocode_cache if geocode_cache is not None else _create_geocode_cache()
+        self._pharmacy_cache = pharmacy_cache if pharmacy_cache is not None else _create_pharmacy_cache()
+        self._zip_index = zip_index if zip_index is not None else get_zip_index()
+
+    def _require_api_key(self) -> str:
+        if not self.api_key:
+            logger.error("Google Places API key not found in environment variables")
+            raise PharmacyLookupError(500, "API key not configured. Please contact the administrator.")
+        return self.api_key
+
+    async def geocode(self, zipcode: str) -> Tuple[float, float]:
+        """Convert a ZIP code to coordinates: offline index, then cache, then Google"""
+        centroid = self._zip_index.lookup(zipcode)
+        if centroid is not None:
+            return centroid
+
+        cache_key = f"zip:{zipcode.strip()}"
+        cached = self._geocode_cache.get(cache_key)
+        if cached is not None:
+            lat, lng = json.loads(cached)
+            return lat, lng
+
+        api_key = self._require_api_key()
+        admit_upstream_call("google")
+
+        # Google Geocoding API call to convert zipcode to coordinates
+        geocode_url = f"{self.api_url}/geocode/json?address={zipcode}&key={api_key}"
+        with observe_upstream("geocode"):
+            geocode_response = await get_http_client().get(geocode_url, timeout=10)
+
+        if geocode_response.status_code != 200:
+            logger.error(f"Geocode API HTTP error: {geocode_response.status_code}")
+            raise PharmacyLookupError(
+                geocode_response.status_code,
+                f"Error connecting to geocoding service: {geocode_response.status_code}"
+            )
+
+        geocode_data = geocode_response.json()
+
+        if geocode_data["status"] != "OK":
+            logger.error(f"Geocode API error: {geocode_data.get('status')}")
+            raise PharmacyLookupError(400, f"Geocoding service error: {geocode_data.get('status')}")
+
+        if not geocode_data["results"]:
+            logger.error("Geocode API returned no results")
+            raise PharmacyLookupError(404, "Location not found for this ZIP code")
+
+        # Extract location data
+        location = geocode_data["results"][0]["geometry"]["location"]
+        lat, lng = location["lat"], location["lng"]
+        logger.info(f"Location found - latitude: {lat}, longitude: {lng}")
+
+        self._geocode_cache.set(cache_key, json.dumps([lat, lng]))
+        return lat, lng
+
+    async def nearby_places(self, lat: float, lng: float,
+                            radius: int = SEARCH_RADIUS_METERS) -> List[Dict[str, Any]]:
+        """Places Nearby Search results for pharmacies, cached per rounded location"""
+        cache_key = f"places:{round(lat, COORDINATE_PRECISION)},{round(lng, COORDINATE_PRECISION)}:{radius}"
+        cached = self._pharmacy_cache.get(cache_key)
+        if cached is not None:
+            note_served_from_cache()
+            return json.loads(cached)
+
+        api_key = self._require_api_key()
+        admit_upstream_call("google")
+
+        # Google Places API call to find nearby pharmacies
+        places_url = f"{self.api_url}/place/nearbysearch/json?location={lat},{lng}&radius={radius}&type=pharmacy&key={api_key}"
+        with observe_upstream("places"):
+            places_response = await get_http_client().get(places_url, timeout=10)
+
+        if places_response.status_code != 200:
+            logger.error(f"Places API HTTP error: {places_response.status_code}")
+            raise PharmacyLookupError(
+                places_response.status_code,
+                f"Error connecting to places service: {places_response.status_code}"
+            )
+
+        places_data = places_response.json()
+
+        if places_data["status"] != "OK":
+            logger.error(f"Places API error: {places_data.get('status')}")
+            raise PharmacyLookupError(400, f"Places service error: {places_data.get('status')}")
+
+        # 캐시에는 화면에 필요한 필드만 JSON 문자열로 저장 (max_bytes가 실제 크기로 계산되도록)
+        places = [
+            {
+                "name": place["name"],
+                "vicinity": place.get("vicinity"),
+                "location": place.get("geometry", {}).get("location"),
+                "open_now": place.get("opening_hours", {}).get("open_now"),
+            }
+            for place in places_data["results"]
+        ]
+        if places:
+            self._pharmacy_cache.set(cache_key, json.dumps(places, separators=(",", ":")))
+        return places
+
+    async def search_pharmacies(self, zipcode: str, limit: int = 3, offset: int = 0,
+                                open_now: bool = False) -> Dict[str, Any]:
+        """
+        One page of nearby pharmacies, nearest first.
+
+        Distances are computed locally from the ZIP code's coordinates, so
+        sorting, filtering and paging never need another upstream call.
+        """
+        logger.info(f"Searching pharmacies for zipcode: {zipcode}")
+        lat, lng = await self.geocode(zipcode)
+        places = await self.nearby_places(lat, lng)
+
+        if not places:
+            logger.warning("No pharmacies found near this location")
+            raise PharmacyLookupError(404, "No pharmacies found near this location")
+
+        ranked = rank_by_distance(places, lat, lng)
+        if open_now:
+            ranked = [(miles, place) for miles, place in ranked if place.get("open_now")]
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        pharmacies = [
+            {
+                "name": place["name"],
+                "address": place.get("vicinity") or "Address not available",
+                "distance": format_distance(miles),
+                "distance_miles": None if miles is None else round(miles, 2),
+                "open_now": place.get("open_now"),
+            }
+            for miles, place in ranked[offset:offset + limit]
+        ]
+
+        logger.info(f"Found {len(pharmacies)} of {len(ranked)} pharmacies near {zipcode}")
+        return {
+            "pharmacies": pharmacies,
+            "total": len(ranked),
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + limit if offset + limit < len(ranked) else None,
+        }
+
+    async def find_pharmacies(self, zipcode: str, limit: int = 3, open_now: bool = False) -> List[Dict[str, Any]]:
+        """The nearest pharmacies for a ZIP code, ready for the JSON response"""
+        page = await self.search_pharmacies(zipcode, limit=limit, open_now=open_now)
+        return page["pharmacies"]
+
+    def flush(self):
+        self._geocode_cache.flush()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "geocode": self._geocode_cache.stats(),
+            "pharmacies": self._pharmacy_cache.stats(),
+            "zip_index": self._zip_index.stats(),
+        }
@@ -0,0 +1,228 @@
+"""
+Token-bucket rate limiting for upstream calls.
+
+Two layers protect the Perplexity and Google quotas:
+
+- per client (CLIENT_RATE_LIMIT/CLIENT_RATE_BURST): RateLimitMiddleware
+  charges one token per request to a route that can call an upstream.
+  Over the limit, routes that can answer from cache still run but may
+  not start upstream calls; other routes get 429 immediately.
+- per upstream, shared by every client (UPSTREAM_RATE_LIMIT_<NAME> and
+  UPSTREAM_RATE_BURST_<NAME>): admit_upstream_call() is checked by the
+  services right before a call that would miss the cache.
+
+A rate of 0 disables a limiter.
+
+Clients are told apart by the peer address. Deployments behind a proxy
+(Vercel) set TRUST_PROXY_HEADERS=true, and TRUSTED_PROXY_HOPS to the
+number of proxies appending to X-Forwarded-For if there is more than one.
+"""
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Tuple
+
+from .metrics import RATE_LIMITED
+
+# 업스트림 이름 -> 기본 (초당 호출 수, 버스트)
+UPSTREAM_DEFAULTS = {
+    "perplexity": (5.0, 20.0),
+    "google": (20.0, 50.0),
+}
+
+# 현재 요청의 클라이언트가 한도를 넘었으면 다시 시도까지 남은 초 (미들웨어가 설정)
+_client_retry_after: ContextVar[Optional[float]] = ContextVar("client_retry_after", default=None)
+
+
+class RateLimitedError(Exception):
+    """A request would exceed a rate limit; retry after `retry_after` seconds"""
+
+    def __init__(self, limiter: str, retry_after: float):
+        super().__init__(f"{limiter} rate limit exceeded")
+        self.limiter = limiter
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to
+    `burst`. acquire() waits for a token; try_acquire() never waits.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.rejected = 0
+        self.waited = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            self.acquired += 1
+            return True
+        self.rejected += 1
+        return False
+
+    async def acquire(self, tokens: float = 1):
+        # 대기자는 도착 순서대로 토큰을 받음
+        async with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                delay = (tokens - self._tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= tokens
+            self.acquired += 1
+
+    def stats(self) -> Dict[str, float]:
+        self._refill()
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "available": round(self._tokens, 2),
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "waited_seconds": round(self.waited, 3),
+        }
+
+
+class KeyedRateLimiter:
+    """
+    One token bucket per key (client), without waiting.
+
+    Only the most recently seen `max_keys` keys are tracked; a key that
+    has been idle long enough to be forgotten would have a full bucket
+    anyway.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> (남은 토큰, 마지막 갱신 시각)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    def try_acquire(self, key: str) -> float:
+        """0 if a token was taken, otherwise seconds until one is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+            self.allowed += 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+            self.limited += 1
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "clients": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_client_rate_limiter() -> Optional[KeyedRateLimiter]:
+    """Per-client limiter for upstream-backed routes, or None when CLIENT_RATE_LIMIT=0"""
+    rate = float(os.getenv("CLIENT_RATE_LIMIT", "0.5"))
+    if rate <= 0:
+        return None
+    return KeyedRateLimiter(
+        rate=rate,
+        burst=float(os.getenv("CLIENT_RATE_BURST", "10")),
+        max_keys=int(os.getenv("CLIENT_RATE_MAX_CLIENTS", "10000")),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_upstream_rate_limiter(upstream: str) -> Optional[TokenBucket]:
+    """Fleet-wide (per process) limiter for one upstream, or None when its rate is 0"""
+    default_rate, default_burst = UPSTREAM_DEFAULTS[upstream]
+    rate = float(os.getenv(f"UPSTREAM_RATE_LIMIT_{upstream.upper()}", str(default_rate)))
+    if rate <= 0:
+        return None
+    return TokenBucket(rate=rate, burst=float(os.getenv(f"UPSTREAM_RATE_BURST_{upstream.upper()}", str(default_burst))))
+
+
+@contextmanager
+def client_over_limit(retry_after: Optional[float]) -> Iterator[None]:
+    """Mark the current request's client as over its limit (None clears the mark)"""
+    token = _client_retry_after.set(retry_after)
+    try:
+        yield
+    finally:
+        _client_retry_after.reset(token)
+
+
+def client_retry_after() -> Optional[float]:
+    return _client_retry_after.get()
+
+
+def admit_upstream_call(upstream: str, charge_client: bool = True):
+    """Raise RateLimitedError unless a new call to `upstream` may start now"""
+    retry_after = _client_retry_after.get()
+    if charge_client and retry_after is not None:
+        RATE_LIMITED.inc(limiter="client", outcome="rejected")
+        raise RateLimitedError("client", retry_after)
+    bucket = get_upstream_rate_limiter(upstream)
+    if bucket is not None and not bucket.try_acquire():
+        RATE_LIMITED.inc(limiter=upstream, outcome="rejected")
+        raise RateLimitedError(upstream, 1 / bucket.rate)
+
+
+def note_served_from_cache():
+    """Count a cache answer given to a client that is over its limit"""
+    if _client_retry_after.get() is not None:
+        RATE_LIMITED.inc(limiter="client", outcome="cache")
+
+
+def rate_limit_stats() -> Dict[str, Optional[Dict[str, float]]]:
+    client = get_client_rate_limiter()
+    stats: Dict[str, Optional[Dict[str, float]]] = {"client": client.stats() if client else None}
+    for upstream in UPSTREAM_DEFAULTS:
+        bucket = get_upstream_rate_limiter(upstream)
+        stats[upstream] = bucket.stats() if bucket else None
+    return stats
+
+
+@lru_cache(maxsize=None)
+def get_batch_rate_limiter() -> TokenBucket:
+    """Perplexity calls made on behalf of batch requests (BATCH_RATE_LIMIT per second)"""
+    return TokenBucket(
+        rate=float(os.getenv("BATCH_RATE_LIMIT", "2")),
+        burst=float(os.getenv("BATCH_RATE_BURST", "5")),
+    )
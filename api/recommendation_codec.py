@@ -0,0 +1,57 @@
+"""
+Compact cache representation of parsed recommendations.
+
+Entries are stored as a minimal JSON array instead of the raw model
+response, so a cache hit skips parsing entirely:
+
+    [[[name, form, side_effects, cvs_search_term], ...], [do, ...], [dont, ...]]
+
+Ranks and pharmacy links are rebuilt from position and search term.
+RESULT_VERSION is part of the cache key; bump FORMAT_VERSION when this
+layout changes (PARSER_VERSION covers parsing rule changes).
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+from .response_parser import CVS_SEARCH_URL, PARSER_VERSION
+
+FORMAT_VERSION = 1
+RESULT_VERSION = f"{PARSER_VERSION}.{FORMAT_VERSION}"
+
+Recommendations = Tuple[List[Dict[str, Any]], Dict[str, List[str]]]
+
+
+def encode_recommendations(medications: List[Dict[str, Any]], management_lists: Dict[str, List[str]]) -> str:
+    packed = [
+        [
+            [
+                medication["name"],
+                medication["medication_type"],
+                medication["side_effects"],
+                medication["cvs_link"][len(CVS_SEARCH_URL):],
+            ]
+            for medication in medications
+        ],
+        management_lists["to_do_list"],
+        management_lists["do_not_list"],
+    ]
+    return json.dumps(packed, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_recommendations(packed: str) -> Recommendations:
+    """Inverse of encode_recommendations; raises ValueError on a malformed entry"""
+    try:
+        packed_medications, to_do_list, do_not_list = json.loads(packed)
+        medications = [
+            {
+                "rank": rank,
+                "name": name,
+                "medication_type": medication_type,
+                "side_effects": side_effects,
+                "cvs_link": f"{CVS_SEARCH_URL}{search_term}",
+            }
+            for rank, (name, medication_type, side_effects, search_term) in enumerate(packed_medications, 1)
+        ]
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Malformed cached recommendations: {e}") from e
+    return medications, {"to_do_list": to_do_list, "do_not_list": do_not_list}
@@ -0,0 +1,193 @@
+"""
+Retry, hedging and circuit breaking for upstream calls.
+
+- RetryPolicy: exponential backoff with full jitter on retryable errors
+  (timeouts, connection errors, 408/425/429/5xx).
+- LatencyTracker: rolling window of successful call latencies, used to
+  derive the hedging delay from the observed p95.
+- hedged(): starts a second identical call when the first has not
+  finished after the delay (if the caller admits it); whichever
+  succeeds first wins.
+- CircuitBreaker: opens when the error ratio over a time window crosses
+  a threshold, fails fast while open, and lets one probe through after
+  the reset timeout. Callers record only retryable errors as failures;
+  a probe that is cancelled or fails otherwise (4xx, bad payload) is
+  released without an outcome, and one still in flight after another
+  reset timeout is replaced by a new probe.
+"""
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """The upstream is failing and calls are short-circuited"""
+    pass
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUSES
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError))
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.2, max_delay: float = 2.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "RetryPolicy":
+        return cls(
+            max_retries=int(os.getenv(f"{prefix}_MAX_RETRIES", "2")),
+            base_delay=float(os.getenv(f"{prefix}_RETRY_BASE_DELAY", "0.2")),
+            max_delay=float(os.getenv(f"{prefix}_RETRY_MAX_DELAY", "2.0")),
+        )
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter backoff before retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: float,
+                 may_hedge: Callable[[], bool] = lambda: True) -> T:
+    """
+    Run `call`; if it has not finished after `delay` seconds and
+    `may_hedge()` allows it, run it again and return the first successful
+    result. Calls still running when this returns or is cancelled are
+    cancelled.
+    """
+    pending = {asyncio.ensure_future(call())}
+    error: Optional[BaseException] = None
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if not done and may_hedge():
+            pending.add(asyncio.ensure_future(call()))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_ratio: float = 0.5, min_requests: int = 10,
+                 window: float = 30.0, reset_timeout: float = 15.0):
+        self.failure_ratio = failure_ratio
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self.opened = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "CircuitBreaker":
+        return cls(
+            failure_ratio=float(os.getenv(f"{prefix}_BREAKER_FAILURE_RATIO", "0.5")),
+            min_requests=int(os.getenv(f"{prefix}_BREAKER_MIN_REQUESTS", "10")),
+            window=float(os.getenv(f"{prefix}_BREAKER_WINDOW", "30")),
+            reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET_TIMEOUT", "15")),
+        )
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            # 반개방 상태에서는 탐색 요청 하나만 통과 (reset_timeout 넘게 걸리면 새 탐색 허용)
+            now = time.monotonic()
+            if self._probe_in_flight and now - self._probe_started < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self._probe_in_flight = True
+            self._probe_started = now
+        return True
+
+    def release_probe(self):
+        """Give up the half-open probe slot without an outcome (e.g. the probe was cancelled)"""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self._probe_in_flight = False
+            self._outcomes.clear()
+            return
+        self._record(True)
+
+    def record_failure(self):
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+        self._record(False)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) >= self.failure_ratio:
+            self._open()
+
+    def _record(self, ok: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        self.opened += 1
+
+    def stats(self) -> Dict[str, object]:
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "window_requests": len(self._outcomes),
+            "window_failures": failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
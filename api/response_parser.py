@@ -0,0 +1,224 @@
+"""
+Single-pass parser for combined Perplexity responses.
+
+The response is tokenized in one regex pass into section headers and
+numbered items, driving a state machine over the MEDICATIONS / DO /
+DON'T sections. The same machine is fed chunk by chunk
+for streamed completions, so whole and streamed responses share parsing
+rules. All patterns are compiled once at import.
+"""
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+# (event type, payload): ("medication", dict) / ("do", str) / ("dont", str)
+Event = Tuple[str, Any]
+
+MAX_ITEMS_PER_SECTION = 3
+# 파싱 규칙이 바뀌면 올려서 캐시된 파싱 결과를 무효화
+PARSER_VERSION = 1
+CVS_SEARCH_URL = "https://www.cvs.com/search?searchTerm="
+
+# 한 번의 finditer로 섹션 헤더와 번호 항목만 토큰화; 그 사이 텍스트는 슬라이스로 처리
+_TOKEN = re.compile(
+    r"^[ \t]*(?:"
+    r"(?P<header>MEDICATIONS|MANAGEMENT|DON'?T|DO)[ \t]*:[^\n]*"
+    r"|\d+\.[ \t]*(?P<item>[^\n]*)"
+    r")",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_BRAND_NAME = re.compile(r"brand name:?\s*([^:\n]+)", re.IGNORECASE)
+_FORM = re.compile(r"form:?\s*([^:\n]+)", re.IGNORECASE)
+_SIDE_EFFECTS = re.compile(r"side effects:?\s*([^\n]+(?:\n\s+[^\n]+)*)", re.IGNORECASE)
+
+_CITATIONS = re.compile(r"\[\d+\](?:\[\d+\])*")
+_SPECIAL_CHARACTERS = re.compile(r"[^\w\s.,()-]")
+_PARENTHESIZED = re.compile(r"\([^)]*\)")
+_STRENGTH_DESIGNATIONS = re.compile(r"(?:extra strength|maximum strength|children's|infant's)", re.IGNORECASE)
+
+
+def create_pharmacy_links(medication_name: str) -> Dict[str, str]:
+    """Create pharmacy links for a medication"""
+    # Clean up the medication name for search
+    search_term = _PARENTHESIZED.sub("", medication_name).strip()
+    # Remove brand designations like "Extra Strength"
+    search_term = _STRENGTH_DESIGNATIONS.sub("", search_term).strip()
+    encoded_search = quote(search_term)
+
+    return {
+        "cvs_link": f"{CVS_SEARCH_URL}{encoded_search}",
+        #"walgreens_link": f"https://www.walgreens.com/search/results.jsp?Ntt={encoded_search}",
+    }
+
+
+def parse_medication_section(section: str, rank: int) -> Optional[Dict[str, Any]]:
+    """Extract one medication from its numbered section, or None if unusable"""
+    if not section.strip() or "none recommended" in section.lower():
+        return None
+
+    name_match = _BRAND_NAME.search(section)
+    if not name_match:
+        logger.warning(f"Skipping medication due to missing name: {section[:200]}")
+        return None
+
+    form_match = _FORM.search(section)
+    side_effects_match = _SIDE_EFFECTS.search(section)
+    name = name_match.group(1).strip()
+
+    medication_info = {
+        "rank": rank,
+        "name": name,
+        "medication_type": form_match.group(1).strip() if form_match else None,
+        "side_effects": side_effects_match.group(1).strip() if side_effects_match else "Not available",
+    }
+    medication_info.update(create_pharmacy_links(name))
+    return medication_info
+
+
+def clean_management_item(item: str) -> str:
+    """Remove reference numbers and special characters from a list item"""
+    item = _CITATIONS.sub("", item)
+    item = _SPECIAL_CHARACTERS.sub("", item)
+    return item.strip()
+
+
+class RecommendationParser:
+    """
+    State machine over section-header and numbered-item tokens.
+
+    feed() accepts arbitrary chunks and returns the events completed so
+    far; only whole lines are tokenized, so a chunk boundary never splits
+    a token. A medication is complete once the next numbered item or
+    section header arrives; close() flushes the rest.
+    """
+
+    PREAMBLE = "preamble"
+    MEDICATIONS = "medications"
+    MANAGEMENT = "management"
+    DO = "do"
+    DONT = "dont"
+
+    _HEADER_STATES = {
+        "MEDICATIONS": MEDICATIONS,
+        "MANAGEMENT": MANAGEMENT,
+        "DO": DO,
+        "DON'T": DONT,
+        "DONT": DONT,
+    }
+
+    def __init__(self, initial_state: str = PREAMBLE):
+        self.state = initial_state
+        self._partial_line = ""
+        self._medication_parts: List[str] = []
+        self._medication_sections = 0
+        self._medication_count = 0
+        self._item_counts = {self.DO: 0, self.DONT: 0}
+
+    def feed(self, text: str) -> List[Event]:
+        """Consume a chunk of text and return the events it completed"""
+        events: List[Event] = []
+        text = self._partial_line + text
+        end = text.rfind("\n") + 1
+        self._partial_line = text[end:]
+        if end:
+            self._tokenize(text[:end], events)
+        return events
+
+    def close(self) -> List[Event]:
+        """Flush whatever is left once the input has ended"""
+        events: List[Event] = []
+        if self._partial_line:
+            self._tokenize(self._partial_line, events)
+            self._partial_line = ""
+        self._flush_medication(events)
+        return events
+
+    def _tokenize(self, text: str, events: List[Event]):
+        if "*" in text:
+            text = text.replace("*", "")
+        position = 0
+        for token in _TOKEN.finditer(text):
+            if self.state == self.MEDICATIONS:
+                self._append_medication_text(text[position:token.start()])
+            position = token.end()
+
+            header = token.group("header")
+            if header is not None:
+                self._flush_medication(events)
+                self.state = self._HEADER_STATES[header.upper()]
+                continue
+
+            item = token.group("item")
+            if self.state == self.MEDICATIONS:
+                self._flush_medication(events)
+                self._medication_parts = [item]
+            elif self.state == self.DO or self.state == self.DONT:
+                if item.strip():
+                    self._emit_item(self.state, item, events)
+
+        if self.state == self.MEDICATIONS:
+            self._append_medication_text(text[position:])
+
+    def _append_medication_text(self, text: str):
+        if self._medication_parts:
+            self._medication_parts.append(text)
+        elif text.strip():
+            # 번호 없는 도입 문장도 하나의 섹션으로 취급 (기존 파서와 동일)
+            self._medication_parts = [text]
+
+    def _flush_medication(self, events: List[Event]):
+        if not self._medication_parts:
+            return
+        section = "".join(self._medication_parts).strip()
+        self._medication_parts = []
+        # 기존 파서처럼 앞의 3개 섹션만 검사
+        if self._medication_sections >= MAX_ITEMS_PER_SECTION:
+            return
+        self._medication_sections += 1
+        medication = parse_medication_section(section, self._medication_count + 1)
+        if medication:
+            self._medication_count += 1
+            events.append(("medication", medication))
+
+    def _emit_item(self, section: str, item: str, events: List[Event]):
+        if self._item_counts[section] >= MAX_ITEMS_PER_SECTION:
+            return
+        self._item_counts[section] += 1
+        events.append((section, clean_management_item(item)))
+
+
+def collect(events: List[Event]) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+    """Group parser events into (medications, management lists)"""
+    medications = []
+    management_lists = {"to_do_list": [], "do_not_list": []}
+    for event_type, payload in events:
+        if event_type == "medication":
+            medications.append(payload)
+        elif event_type == "do":
+            management_lists["to_do_list"].append(payload)
+        else:
+            management_lists["do_not_list"].append(payload)
+    return medications, management_lists
+
+
+def parse_text(text: str, initial_state: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+    parser = RecommendationParser(initial_state)
+    events = parser.feed(text)
+    events.extend(parser.close())
+    return collect(events)
+
+
+def parse_combined_response(response_text: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+    """Parse a whole combined response into medications and management lists"""
+    if response_text.count("MANAGEMENT:") != 1:
+        logger.error("Could not split response into medications and management sections")
+        return [], {"to_do_list": [], "do_not_list": []}
+
+    medications, management_lists = parse_text(response_text, RecommendationParser.MEDICATIONS)
+    if not medications:
+        logger.error("No medications found in response")
+    return medications, management_lists
@@ -0,0 +1,226 @@
+"""
+Near-duplicate matching of symptom profiles for recommendation cache lookups.
+
+Exact cache keys only merge requests that normalize to the same tokens, so
+"sore throat, cough" and "coughing, throat pain" miss each other. Each
+symptom is mapped to a canonical concept (synonym dictionary plus light
+stemming) and a profile becomes the set of its concepts. The index finds
+the cached profile with the highest cosine similarity between concept sets
+among profiles in the same age/gender/allergy bucket, using an inverted
+index so only profiles sharing at least one concept are scored.
+
+A cached profile only matches when it covers every concept of the
+request: "cough, fever" may be answered from "cough, fever, sore throat",
+but "cough, fever, chest pain" is never answered from "cough, fever",
+however high the score, since that would silently drop a symptom.
+
+Disabled by default; enable with SEMANTIC_CACHE=true and tune
+SEMANTIC_CACHE_THRESHOLD (0-1, default 0.8). Evaluate a threshold offline
+with `python -m benchmarks.eval_similarity`.
+"""
+import os
+import re
+import math
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from .cache_keys import SymptomProfile, normalize_token
+
+_WORDS = re.compile(r"[a-z]+")
+
+# 정도를 나타내는 수식어는 무시
+_MODIFIERS = {
+    "a", "an", "the", "my", "of", "and", "with", "some", "very", "really", "slight", "slightly",
+    "mild", "moderate", "severe", "bad", "terrible", "constant", "persistent", "little", "bit", "lot",
+}
+
+# 표현 -> 대표 증상 (키와 값 모두 아래에서 같은 방식으로 어간 처리됨)
+# 같은 증상의 철자·표현 차이만 묶음: 오한/발열, 편두통/두통처럼 임상적으로 다른 증상은 합치지 않음
+SYNONYMS = {
+    "throat pain": "sore throat", "painful throat": "sore throat", "scratchy throat": "sore throat",
+    "throat ache": "sore throat", "irritated throat": "sore throat", "pharyngitis": "sore throat",
+    "coughing": "cough", "hacking cough": "cough",
+    "productive cough": "chesty cough", "wet cough": "chesty cough", "phlegm": "chesty cough",
+    "mucus": "chesty cough",
+    "stuffy nose": "congestion", "blocked nose": "congestion", "stuffed nose": "congestion",
+    "nasal congestion": "congestion", "sinus congestion": "congestion", "congested": "congestion",
+    "running nose": "runny nose", "rhinorrhea": "runny nose", "drippy nose": "runny nose",
+    "sneeze": "sneezing",
+    "head ache": "headache", "head pain": "headache", "head hurts": "headache",
+    "high temperature": "fever", "temperature": "fever", "feverish": "fever", "pyrexia": "fever",
+    "body ache": "muscle ache", "muscle pain": "muscle ache", "aching muscles": "muscle ache",
+    "sore muscles": "muscle ache", "myalgia": "muscle ache",
+    "nauseous": "nausea", "queasy": "nausea", "feeling sick": "nausea",
+    "vomit": "vomiting", "throwing up": "vomiting",
+    "stomach ache": "stomach pain", "stomachache": "stomach pain", "tummy ache": "stomach pain",
+    "abdominal pain": "stomach pain", "belly ache": "stomach pain",
+    "loose stools": "diarrhea", "diarrhoea": "diarrhea",
+    "constipated": "constipation",
+    "tired": "fatigue", "tiredness": "fatigue", "exhaustion": "fatigue", "exhausted": "fatigue",
+    "lethargy": "fatigue",
+    "itchy skin": "itching", "itchiness": "itching", "itchy": "itching", "pruritus": "itching",
+    "skin rash": "rash",
+    "trouble sleeping": "insomnia", "sleeplessness": "insomnia", "cant sleep": "insomnia",
+    "heartburn": "acid reflux", "reflux": "acid reflux",
+    "eye irritation": "irritated eyes",
+    "dizzy": "dizziness", "lightheaded": "dizziness",
+    "allergies": "allergy",
+}
+
+
+def _stem(word: str) -> str:
+    """Strip common English suffixes (coughing -> cough, aches -> ach)"""
+    for suffix in ("ing", "ness", "es", "ed", "s", "y"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= (4 if suffix == "y" else 3):
+            word = word[:-len(suffix)]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def _stem_phrase(text: str) -> str:
+    words = [word for word in _WORDS.findall(normalize_token(text).replace("'", "")) if word not in _MODIFIERS]
+    return " ".join(_stem(word) for word in words)
+
+
+_STEMMED_SYNONYMS = {_stem_phrase(phrase): _stem_phrase(concept) for phrase, concept in SYNONYMS.items()}
+
+
+def symptom_concept(symptom: str) -> str:
+    """Canonical concept for one free-text symptom"""
+    stemmed = _stem_phrase(symptom)
+    return _STEMMED_SYNONYMS.get(stemmed, stemmed)
+
+
+def symptom_concepts(symptoms: Iterable[str]) -> FrozenSet[str]:
+    concepts = {symptom_concept(symptom) for symptom in symptoms}
+    concepts.discard("")
+    return frozenset(concepts)
+
+
+Bucket = Tuple[str, str, Tuple[str, ...]]
+
+
+def profile_bucket(profile: SymptomProfile) -> Bucket:
+    """Only profiles with the same age bucket, gender and allergies may match"""
+    return profile.age_bucket, profile.gender, profile.allergies
+
+
+@dataclass(frozen=True)
+class Match:
+    cache_key: str
+    score: float
+
+
+class SimilarityIndex:
+    """
+    Bounded in-memory index of cached profiles, oldest forgotten first.
+
+    Entries point at recommendation cache keys; an entry whose cache
+    entry has since been evicted is discarded by the caller on lookup.
+    Not thread-safe: used from the event loop only.
+    """
+
+    def __init__(self, threshold: float = 0.8, max_entries: int = 4096):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Bucket, FrozenSet[str]]]" = OrderedDict()
+        self._postings: Dict[Tuple[Bucket, str], Set[str]] = {}
+        self.lookups = 0
+        self.matches = 0
+        self.below_threshold = 0
+        self.uncovered = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, profile: SymptomProfile, cache_key: str):
+        if cache_key in self._entries:
+            self._entries.move_to_end(cache_key)
+            return
+        concepts = symptom_concepts(profile.symptoms)
+        if not concepts:
+            return
+        bucket = profile_bucket(profile)
+        self._entries[cache_key] = (bucket, concepts)
+        for concept in concepts:
+            self._postings.setdefault((bucket, concept), set()).add(cache_key)
+        while len(self._entries) > self.max_entries:
+            self.discard(next(iter(self._entries)))
+
+    def discard(self, cache_key: str):
+        entry = self._entries.pop(cache_key, None)
+        if entry is None:
+            return
+        bucket, concepts = entry
+        for concept in concepts:
+            keys = self._postings.get((bucket, concept))
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:
+                    del self._postings[(bucket, concept)]
+
+    def nearest(self, profile: SymptomProfile, threshold: Optional[float] = None,
+                covering: bool = True) -> Optional[Match]:
+        """
+        Most similar indexed profile in the same bucket, if it reaches the
+        threshold. With covering=False profiles missing some of the
+        request's concepts are scored too (offline evaluation only).
+        """
+        threshold = self.threshold if threshold is None else threshold
+        self.lookups += 1
+        concepts = symptom_concepts(profile.symptoms)
+        bucket = profile_bucket(profile)
+        exact_key = profile.cache_key
+
+        # 공통 개념 수 = 이진 벡터의 내적
+        overlaps: Counter = Counter()
+        for concept in concepts:
+            overlaps.update(self._postings.get((bucket, concept), ()))
+        overlaps.pop(exact_key, None)
+
+        best: Optional[Match] = None
+        skipped = False
+        for cache_key, overlap in overlaps.items():
+            if covering and overlap < len(concepts):
+                # 요청 증상 중 하나라도 없는 항목은 점수와 무관하게 제외
+                skipped = True
+                continue
+            score = overlap / math.sqrt(len(concepts) * len(self._entries[cache_key][1]))
+            if best is None or score > best.score:
+                best = Match(cache_key, score)
+
+        if best is None or best.score < threshold:
+            if best is not None:
+                self.below_threshold += 1
+            elif skipped:
+                self.uncovered += 1
+            return None
+        self.matches += 1
+        return best
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "matches": self.matches,
+            "below_threshold": self.below_threshold,
+            "uncovered": self.uncovered,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_similarity_index() -> Optional[SimilarityIndex]:
+    """Process-wide index, or None when SEMANTIC_CACHE is off"""
+    if os.getenv("SEMANTIC_CACHE", "False").lower() != "true":
+        return None
+    return SimilarityIndex(
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "4096")),
+    )
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls that share a key.
+
+    The first caller for a key starts the work; callers arriving while it
+    is still running await the same task and receive the same result or
+    exception. Nothing is remembered once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """The task running for `key`, starting `fn` if there is none"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _, key=key: self._calls.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.info("Joining in-flight request for identical query")
+        return task
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # shield: one caller disconnecting must not cancel the shared call
+        return await asyncio.shield(self.start(key, fn))
+
+    def running(self, key: str) -> bool:
+        return key in self._calls
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight(),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+class Broadcast:
+    """
+    Items produced by one in-flight call, replayed to any number of
+    readers: each reader gets everything published so far, then new
+    items as they arrive, until the producer closes it.
+    """
+
+    def __init__(self):
+        self._items: List[Any] = []
+        self._changed = asyncio.Event()
+        self.closed = False
+
+    def publish(self, items: List[Any]):
+        if items:
+            self._items.extend(items)
+            self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        # 기다리던 독자를 깨우고 다음 대기용 이벤트로 교체
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def replay(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            while index < len(self._items):
+                yield self._items[index]
+                index += 1
+            if self.closed:
+                return
+            await self._changed.wait()
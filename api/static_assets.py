@@ -0,0 +1,147 @@
+"""
+Fingerprinted, pre-compressed static assets and conditional responses.
+
+At startup every file under the static directory is read once and
+hashed; each is compressed (gzip, plus brotli when the optional `brotli`
+package is installed) on its first request and kept. Templates link assets through asset_url(), which returns a
+content-addressed URL such as /static/css/style.3f2a9c1b7d4e.css that is
+served with an immutable one-year Cache-Control. Plain paths keep
+working and are revalidated through their ETag.
+"""
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+import importlib.util
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+# 이미 압축된 형식은 다시 압축하지 않음
+COMPRESSIBLE_PREFIXES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 256
+FINGERPRINT_LENGTH = 12
+
+if importlib.util.find_spec("brotli") is not None:
+    import brotli
+else:
+    brotli = None
+
+
+class CompressedBody:
+    """One response body with its ETag and pre-compressed variants"""
+
+    __slots__ = ("body", "media_type", "etag", "compressible", "_encoded")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.compressible = len(body) >= MIN_COMPRESS_SIZE and media_type.startswith(COMPRESSIBLE_PREFIXES)
+        self._encoded: Optional[Dict[str, bytes]] = None
+
+    @property
+    def encoded(self) -> Dict[str, bytes]:
+        # 콜드 스타트 비용을 줄이기 위해 첫 요청 때 압축
+        if self._encoded is None:
+            encoded = {}
+            if self.compressible:
+                encoded["gzip"] = gzip.compress(self.body, compresslevel=9, mtime=0)
+                if brotli is not None:
+                    encoded["br"] = brotli.compress(self.body, quality=11)
+            self._encoded = encoded
+        return self._encoded
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in self.encoded and encoding in accepted:
+                return encoding
+        return None
+
+    def response(self, request: Request, cache_control: str, status_code: int = 200) -> Response:
+        """Full response, or 304 when If-None-Match matches the ETag"""
+        headers = {"ETag": self.etag, "Cache-Control": cache_control}
+        if self.compressible:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(request.headers.get("if-none-match", ""), self.etag):
+            return Response(status_code=304, headers=headers)
+
+        body = self.body
+        encoding = self.choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None:
+            body = self.encoded[encoding]
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(body, status_code=status_code, headers=headers, media_type=self.media_type)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # 약한 비교: W/ 접두사는 무시
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates
+
+
+def _fingerprinted_name(path: str, body: bytes) -> str:
+    root, extension = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(body).hexdigest()[:FINGERPRINT_LENGTH]}{extension}"
+
+
+class StaticAssets:
+    """ASGI app serving the static directory from memory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._assets: Dict[str, CompressedBody] = {}
+        self._urls: Dict[str, str] = {}
+        self._fingerprinted: Dict[str, str] = {}
+        self.load()
+
+    def load(self):
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.startswith("."):
+                    continue
+                full_path = os.path.join(root, filename)
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    body = f.read()
+                media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                if media_type.startswith("text/"):
+                    media_type += "; charset=utf-8"
+                self._assets[path] = CompressedBody(body, media_type)
+                fingerprinted = _fingerprinted_name(path, body)
+                self._urls[path] = f"/static/{fingerprinted}"
+                self._fingerprinted[fingerprinted] = path
+        logger.info(f"Loaded {len(self._assets)} static assets (brotli {'on' if brotli else 'off'})")
+
+    def url(self, path: str) -> str:
+        """Content-addressed URL for a static file, e.g. asset_url('css/style.css')"""
+        path = path.lstrip("/")
+        return self._urls.get(path, f"/static/{path}")
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        # 마운트 경로(root_path)를 뺀 나머지가 파일 경로
+        path = scope["path"][len(scope.get("root_path", "")):].lstrip("/")
+        if request.method not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405)
+        elif path in self._fingerprinted:
+            response = self._assets[self._fingerprinted[path]].response(request, IMMUTABLE_CACHE_CONTROL)
+        elif path in self._assets:
+            response = self._assets[path].response(request, REVALIDATE_CACHE_CONTROL)
+        else:
+            response = PlainTextResponse("Not Found", status_code=404)
+        await response(scope, receive, send)
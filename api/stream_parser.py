@@ -0,0 +1,37 @@
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class SectionedEvents:
+    """
+    Split one ordered event stream into per-section async iterators.
+
+    Templates render sections in document order; an event that arrives
+    for a later section is held back until that section is rendered, and
+    one for a section already rendered is dropped.
+    """
+
+    def __init__(self, events, order=("stale", "medication", "do", "dont")):
+        self._events = events.__aiter__()
+        self._order = list(order)
+        self._held: Dict[str, List[Any]] = {}
+        self._exhausted = False
+
+    async def section(self, name: str):
+        for payload in self._held.pop(name, []):
+            yield payload
+        while not self._exhausted:
+            try:
+                event_type, payload = await self._events.__anext__()
+            except StopAsyncIteration:
+                self._exhausted = True
+                return
+            if event_type == name:
+                yield payload
+            elif self._order.index(event_type) < self._order.index(name):
+                logger.warning(f"Dropping late '{event_type}' event while rendering '{name}'")
+            else:
+                self._held.setdefault(event_type, []).append(payload)
+                return
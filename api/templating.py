@@ -0,0 +1,85 @@
+"""
+Template environments, optionally backed by precompiled templates.
+
+Compiling a Jinja template (parse + code generation) is the bulk of the
+first render after a cold start. Templates can be compiled ahead of time
+into Python modules:
+
+    python -m api.templating build
+
+The deploy build (`npm run build`) runs this step, so deployments start
+with them. At startup the precompiled modules are used only when they
+were built from exactly the current template sources; otherwise
+templates are compiled on demand as usual.
+"""
+import os
+import sys
+import hashlib
+import logging
+import argparse
+
+from jinja2 import BaseLoader, ChoiceLoader, Environment, FileSystemLoader, ModuleLoader
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = "templates"
+PRECOMPILED_DIR = os.getenv("TEMPLATES_PRECOMPILED_DIR", os.path.join("build", "templates"))
+SOURCE_STAMP = "SOURCE_HASH"
+
+
+def _source_hash(directory: str = TEMPLATES_DIR) -> str:
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(directory)):
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            digest.update(os.path.relpath(path, directory).encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _precompiled_target(is_async: bool) -> str:
+    return os.path.join(PRECOMPILED_DIR, "async" if is_async else "sync")
+
+
+def _precompiled_is_current() -> bool:
+    try:
+        with open(os.path.join(PRECOMPILED_DIR, SOURCE_STAMP), encoding="utf-8") as f:
+            return f.read().strip() == _source_hash()
+    except OSError:
+        return False
+
+
+def create_environment(is_async: bool = False) -> Environment:
+    """Autoescaping environment over templates/, preferring precompiled modules"""
+    loader: BaseLoader = FileSystemLoader(TEMPLATES_DIR)
+    if _precompiled_is_current():
+        # 미리 컴파일된 모듈에 없는 템플릿은 원본에서 컴파일
+        loader = ChoiceLoader([ModuleLoader(_precompiled_target(is_async)), loader])
+    elif os.path.isdir(PRECOMPILED_DIR):
+        logger.warning(f"Precompiled templates in {PRECOMPILED_DIR} are out of date; compiling on demand")
+    return Environment(loader=loader, autoescape=True, enable_async=is_async)
+
+
+def build():
+    """Compile every template for both the sync and async environments"""
+    for is_async in (False, True):
+        environment = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True, enable_async=is_async)
+        environment.compile_templates(_precompiled_target(is_async), zip=None, ignore_errors=False)
+    with open(os.path.join(PRECOMPILED_DIR, SOURCE_STAMP), "w", encoding="utf-8") as f:
+        f.write(_source_hash())
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Precompile Jinja templates")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help=f"compile templates/ into {PRECOMPILED_DIR}")
+    parser.parse_args(argv)
+
+    build()
+    print(f"Compiled templates into {PRECOMPILED_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Warm the recommendation cache from historical traffic.
+
+Usage:
+    python -m api.warm_cache requests.jsonl [--top 300] [--concurrency 4] [--rate 1]
+
+Each line is either a comma-separated symptom list ("headache, fever")
+or a JSON object with "symptoms", "gender", "age" and "allergic" keys,
+as in an anonymized request log. Lines are grouped by cache key and the
+most frequent `top` profiles are fetched first, with bounded concurrency
+and a token-bucket rate limit. Profiles that are already cached are
+skipped; the others are fetched from the upstream even when a similar
+profile is cached (SEMANTIC_CACHE), so each gets its own entry.
+
+The app warms itself in the background when WARM_CACHE_LOG names such a
+file: once at startup, then every WARM_CACHE_INTERVAL seconds if set.
+The report (coverage of logged requests, duration) of the last run is
+in /api/cache/stats.
+"""
+import os
+import sys
+import json
+import asyncio
+import time
+import logging
+import argparse
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import load_config
+from .cache import get_recommendation_cache
+from .cache_keys import SymptomProfile
+from .http_client import close_http_client
+from .logging_config import configure_logging, log_event
+from .perplexity_service import get_perplexity_service
+from .rate_limit import RateLimitedError, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+WARM_CACHE_TOP = int(os.getenv("WARM_CACHE_TOP", "300"))
+WARM_CACHE_CONCURRENCY = int(os.getenv("WARM_CACHE_CONCURRENCY", "4"))
+WARM_CACHE_RATE = float(os.getenv("WARM_CACHE_RATE", "1"))
+WARM_CACHE_BURST = float(os.getenv("WARM_CACHE_BURST", "3"))
+
+# 마지막 워밍 결과 (/api/cache/stats, /metrics에 노출)
+_last_report: Optional[Dict[str, Any]] = None
+
+
+def read_profiles(path: str) -> Iterator[Dict[str, str]]:
+    """Yield request profiles from a warm-up file"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                data = json.loads(line)
+                symptoms = data.get("symptoms", "")
+                if isinstance(symptoms, list):
+                    symptoms = ", ".join(symptoms)
+                yield {
+                    "symptoms": symptoms,
+                    "gender": data.get("gender", "not specified"),
+                    "age": str(data.get("age", "not specified")),
+                    "allergic": data.get("allergic", "none"),
+                }
+            else:
+                yield {"symptoms": line, "gender": "not specified", "age": "not specified", "allergic": "none"}
+
+
+def _symptom_list(profile: Dict[str, str]) -> List[str]:
+    return [s.strip() for s in profile["symptoms"].split(",") if s.strip()]
+
+
+def _cache_key(profile: Dict[str, str]) -> str:
+    return SymptomProfile.from_request(
+        _symptom_list(profile), profile["gender"], profile["age"], profile["allergic"]
+    ).cache_key
+
+
+def rank_profiles(profiles: Iterable[Dict[str, str]]) -> List[Tuple[str, int, Dict[str, str]]]:
+    """(cache key, request count, first-seen profile), most frequent first"""
+    counts: Counter = Counter()
+    examples: Dict[str, Dict[str, str]] = {}
+    for profile in profiles:
+        if not _symptom_list(profile):
+            continue
+        key = _cache_key(profile)
+        counts[key] += 1
+        examples.setdefault(key, profile)
+    return [(key, count, examples[key]) for key, count in counts.most_common()]
+
+
+async def warm_profiles(ranked: List[Tuple[str, int, Dict[str, str]]], top: int = WARM_CACHE_TOP,
+                        concurrency: int = WARM_CACHE_CONCURRENCY,
+                        limiter: Optional[TokenBucket] = None) -> Dict[str, Any]:
+    """Fetch the `top` most frequent uncached profiles and report coverage"""
+    service = get_perplexity_service()
+    cache = get_recommendation_cache()
+    limiter = limiter or TokenBucket(rate=WARM_CACHE_RATE, burst=WARM_CACHE_BURST)
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"cached": 0, "fetched": 0, "failed": 0, "rate_limited": 0}
+    start_time = time.perf_counter()
+
+    async def warm_one(key: str, profile: Dict[str, str]):
+        async with semaphore:
+            # 적중/실패 통계와 LRU 순서에 영향을 주지 않도록 조회 대신 존재 여부만 확인
+            if cache.contains(key):
+                counts["cached"] += 1
+                return
+            await limiter.acquire()
+            try:
+                # 유사 프로필 매칭을 거치지 않고 업스트림에서 받아 이 키를 채움
+                medications, _ = await service.fetch_recommendations(
+                    _symptom_list(profile), profile["gender"], profile["age"], profile["allergic"]
+                )
+            except RateLimitedError as e:
+                # 업스트림 전체 한도에 걸리면 이번 회차에서는 건너뜀
+                logger.warning(f"Cache warm-up deferred by rate limit: {e}")
+                counts["rate_limited"] += 1
+                return
+            if medications:
+                counts["fetched"] += 1
+            else:
+                counts["failed"] += 1
+                logger.warning(f"Could not warm cache for: {profile['symptoms']}")
+
+    selected = ranked[:top]
+    await asyncio.gather(*(warm_one(key, profile) for key, _, profile in selected))
+    await asyncio.to_thread(cache.flush)
+
+    # 로그의 요청 중 지금 캐시로 응답할 수 있는 비율
+    total_requests = sum(count for _, count, _ in ranked)
+    covered_requests = sum(count for key, count, _ in ranked if cache.contains(key))
+    return {
+        "profiles": len(ranked),
+        "selected": len(selected),
+        **counts,
+        "requests": total_requests,
+        "coverage": round(covered_requests / total_requests, 4) if total_requests else 0.0,
+        "duration_seconds": round(time.perf_counter() - start_time, 3),
+        "finished_at": time.time(),
+    }
+
+
+async def warm_from_log(path: str, **options) -> Dict[str, Any]:
+    """Warm from a request log and remember the report"""
+    global _last_report
+    report = await warm_profiles(rank_profiles(read_profiles(path)), **options)
+    _last_report = {"source": path, **report}
+    log_event(logger, "cache_warmup", "Cache warm-up finished", force=True, **_last_report)
+    return _last_report
+
+
+async def warm_on_schedule(path: str, interval: float = 0):
+    """Warm once, then again every `interval` seconds (0 = once)"""
+    while True:
+        try:
+            await warm_from_log(path)
+        except Exception:
+            # 워밍 실패가 앱 동작에 영향을 주지 않도록 기록만 함
+            logger.exception(f"Cache warm-up from {path} failed")
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
+
+
+def last_report() -> Optional[Dict[str, Any]]:
+    return _last_report
+
+
+async def warm(path: str, top: int = WARM_CACHE_TOP, concurrency: int = WARM_CACHE_CONCURRENCY,
+               rate: float = WARM_CACHE_RATE, burst: float = WARM_CACHE_BURST) -> Dict[str, Any]:
+    try:
+        return await warm_from_log(
+            path, top=top, concurrency=concurrency, limiter=TokenBucket(rate=rate, burst=burst)
+        )
+    finally:
+        await close_http_client()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Warm the Meditrek recommendation cache")
+    parser.add_argument("profiles", help="request log or file with one symptom profile per line")
+    parser.add_argument("--top", type=int, default=WARM_CACHE_TOP, help="most frequent profiles to warm")
+    parser.add_argument("--concurrency", type=int, default=WARM_CACHE_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=WARM_CACHE_RATE, help="upstream calls per second")
+    parser.add_argument("--burst", type=float, default=WARM_CACHE_BURST)
+    args = parser.parse_args(argv)
+
+    load_config()
+    configure_logging()
+    report = asyncio.run(warm(args.profiles, args.top, args.concurrency, args.rate, args.burst))
+    print(f"Warmed {report['fetched']} of {report['selected']} profiles "
+          f"({report['cached']} already cached, {report['failed']} failed, "
+          f"{report['rate_limited']} rate limited) in {report['duration_seconds']:.2f}s; "
+          f"coverage {report['coverage']:.1%} of {report['requests']} logged requests")
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Offline US ZIP code centroid index.
+
+The binary file holds two little-endian float32 arrays (latitude, then
+longitude) indexed directly by the numeric 5-digit ZIP code, with NaN for
+ZIPs that do not exist. It is memory-mapped, so loading is instant and a
+lookup is a single array access.
+
+The file is not checked in; the deploy build (`npm run build`) creates
+it straight from the public-domain Census Gazetteer ZCTA file:
+
+    python -m api.zip_index download [--year 2023]
+
+or from a local copy of it (or any CSV with zip, lat and lng columns):
+
+    python -m api.zip_index build 2023_Gaz_zcta_national.txt data/zip_centroids.bin
+
+Without the file every ZIP lookup costs a Geocoding API call. The app
+logs an error at startup when it is missing, and refuses to start with
+ZIP_CENTROIDS_REQUIRED=true.
+"""
+import io
+import os
+import re
+import sys
+import csv
+import math
+import mmap
+import array
+import logging
+import zipfile
+import argparse
+import tempfile
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+ZIP_SPACE = 100000
+MAGIC = b"MTZIP001"
+HEADER_SIZE = 16  # magic + reserved
+FILE_SIZE = HEADER_SIZE + 2 * ZIP_SPACE * 4  # 헤더 + float32 위도/경도 배열
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "zip_centroids.bin")
+ZIP_CENTROIDS_REQUIRED = os.getenv("ZIP_CENTROIDS_REQUIRED", "False").lower() == "true"
+GAZETTEER_YEAR = 2023
+GAZETTEER_URL = "https://www2.census.gov/geo/docs/maps-data/data/gazetteer/{year}_Gazetteer/{year}_Gaz_zcta_national.zip"
+
+_ZIP_PATTERN = re.compile(r"^\d{5}$")
+
+# Gazetteer / common CSV column names
+_ZIP_COLUMNS = ("zip", "zipcode", "zcta", "geoid", "zcta5")
+_LAT_COLUMNS = ("lat", "latitude", "intptlat")
+_LNG_COLUMNS = ("lng", "lon", "long", "longitude", "intptlong")
+
+
+class ZipCentroidIndex:
+    """O(1) ZIP -> (lat, lng) lookup over flat float32 arrays"""
+
+    def __init__(self, latitudes, longitudes, source: Optional[str] = None):
+        self._latitudes = latitudes
+        self._longitudes = longitudes
+        self.source = source
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def empty(cls) -> "ZipCentroidIndex":
+        return cls(None, None)
+
+    @classmethod
+    def from_binary(cls, path: str) -> "ZipCentroidIndex":
+        """Memory-map a file written by write_binary"""
+        with open(path, "rb") as f:
+            # 잘린 파일을 매핑하면 엉뚱한 좌표를 돌려주므로 크기부터 확인
+            size = os.fstat(f.fileno()).st_size
+            if size != FILE_SIZE:
+                raise ValueError(f"{path} is {size} bytes, expected {FILE_SIZE}")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a ZIP centroid index")
+        if sys.byteorder != "little":
+            # mmap 배열은 little-endian 전제; 다른 환경에서는 메모리로 읽어 변환
+            values = array.array("f", mapped[HEADER_SIZE:])
+            values.byteswap()
+            return cls(values[:ZIP_SPACE], values[ZIP_SPACE:], source=path)
+        values = memoryview(mapped)[HEADER_SIZE:].cast("f")
+        return cls(values[:ZIP_SPACE], values[ZIP_SPACE:], source=path)
+
+    @classmethod
+    def from_csv(cls, path: str) -> "ZipCentroidIndex":
+        latitudes, longitudes = _empty_arrays()
+        for zipcode, lat, lng in read_centroid_csv(path):
+            latitudes[zipcode] = lat
+            longitudes[zipcode] = lng
+        return cls(latitudes, longitudes, source=path)
+
+    def lookup(self, zipcode: str) -> Optional[Tuple[float, float]]:
+        """Centroid for a 5-digit ZIP code, or None if unknown"""
+        zipcode = zipcode.strip()
+        if self._latitudes is None or not _ZIP_PATTERN.match(zipcode):
+            self.misses += 1
+            return None
+        index = int(zipcode)
+        lat = self._latitudes[index]
+        if math.isnan(lat):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return round(lat, 6), round(self._longitudes[index], 6)
+
+    def __len__(self) -> int:
+        if self._latitudes is None:
+            return 0
+        return sum(1 for lat in self._latitudes if not math.isnan(lat))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "source": self.source,
+            "loaded": self._latitudes is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def write_binary(self, path: str):
+        latitudes = array.array("f", self._latitudes)
+        longitudes = array.array("f", self._longitudes)
+        if sys.byteorder != "little":
+            latitudes.byteswap()
+            longitudes.byteswap()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(MAGIC.ljust(HEADER_SIZE, b"\0"))
+            latitudes.tofile(f)
+            longitudes.tofile(f)
+
+
+def _empty_arrays() -> Tuple[array.array, array.array]:
+    nan = float("nan")
+    return array.array("f", [nan]) * ZIP_SPACE, array.array("f", [nan]) * ZIP_SPACE
+
+
+def _find_column(fieldnames: Iterable[str], candidates: Tuple[str, ...]) -> str:
+    normalized = {name.strip().lower(): name for name in fieldnames}
+    for candidate in candidates:
+        if candidate in normalized:
+            return normalized[candidate]
+    raise ValueError(f"None of the columns {candidates} found in {list(fieldnames)}")
+
+
+def read_centroid_csv(path: str) -> Iterable[Tuple[int, float, float]]:
+    """Yield (zip, lat, lng) from a comma- or tab-separated file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        sample = f.readline()
+        f.seek(0)
+        delimiter = "\t" if "\t" in sample else ","
+        reader = csv.DictReader(f, delimiter=delimiter)
+        zip_column = _find_column(reader.fieldnames, _ZIP_COLUMNS)
+        lat_column = _find_column(reader.fieldnames, _LAT_COLUMNS)
+        lng_column = _find_column(reader.fieldnames, _LNG_COLUMNS)
+        for row in reader:
+            zipcode = row[zip_column].strip().zfill(5)
+            if not _ZIP_PATTERN.match(zipcode):
+                continue
+            yield int(zipcode), float(row[lat_column]), float(row[lng_column])
+
+
+def download_gazetteer(year: int = GAZETTEER_YEAR, directory: Optional[str] = None) -> str:
+    """Fetch and unpack the Census ZCTA Gazetteer file; returns the path of the .txt"""
+    url = GAZETTEER_URL.format(year=year)
+    response = httpx.get(url, timeout=120, follow_redirects=True)
+    response.raise_for_status()
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        name = next(name for name in archive.namelist() if name.endswith(".txt"))
+        return archive.extract(name, directory or tempfile.gettempdir())
+
+
+def zip_index_path() -> str:
+    return os.getenv("ZIP_CENTROIDS_PATH", DEFAULT_PATH)
+
+
+@lru_cache(maxsize=None)
+def check_zip_index() -> bool:
+    """
+    Report a missing index file loudly, once per process (at app startup,
+    before the index is first loaded); raises with ZIP_CENTROIDS_REQUIRED=true.
+    """
+    path = zip_index_path()
+    if os.path.exists(path):
+        return True
+    message = (f"ZIP centroid index not found at {path}; every ZIP lookup will call the Geocoding API. "
+               f"Build it with: python -m api.zip_index download")
+    if ZIP_CENTROIDS_REQUIRED:
+        raise FileNotFoundError(message)
+    logger.error(message)
+    return False
+
+
+@lru_cache(maxsize=None)
+def get_zip_index() -> ZipCentroidIndex:
+    """Process-wide index loaded from ZIP_CENTROIDS_PATH (.bin or .csv)"""
+    path = zip_index_path()
+    if not check_zip_index():
+        return ZipCentroidIndex.empty()
+    try:
+        if path.endswith(".bin"):
+            return ZipCentroidIndex.from_binary(path)
+        return ZipCentroidIndex.from_csv(path)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load ZIP centroid index from {path}: {e}")
+        return ZipCentroidIndex.empty()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build the offline ZIP centroid index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="convert a centroid CSV to the binary index")
+    build.add_argument("source", help="CSV/TSV with zip, lat and lng columns")
+    build.add_argument("output", nargs="?", default=DEFAULT_PATH)
+    download = subparsers.add_parser("download", help="fetch the Census ZCTA Gazetteer and build the index")
+    download.add_argument("--year", type=int, default=GAZETTEER_YEAR)
+    download.add_argument("output", nargs="?", default=DEFAULT_PATH)
+    args = parser.parse_args(argv)
+
+    source = args.source if args.command == "build" else download_gazetteer(args.year)
+    index = ZipCentroidIndex.from_csv(source)
+    index.write_binary(args.output)
+    print(f"Wrote {len(index)} ZIP centroids to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Throughput of /recommend and /api/pharmacies against slow upstreams.
+
+Usage:
+    python -m benchmarks.bench_async_upstream --latency 0.5 --concurrency 1 10 50
+
+Every request uses a distinct symptom set so the recommendation cache
+never short-circuits the upstream call.
+"""
+import os
+import time
+import asyncio
+import argparse
+import itertools
+
+import httpx
+
+from .stub_upstream import StubUpstream
+
+
+async def _drive(client: httpx.AsyncClient, concurrency: int, total: int, counter) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            if i % 2:
+                response = await client.get("/api/pharmacies", params={"zipcode": "95132"})
+            else:
+                response = await client.post("/recommend", data={
+                    "symptoms": f"cough, symptom {next(counter)}",
+                    "gender": "female", "age": "35", "allergic": "none",
+                })
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start
+
+
+async def main(latency: float, levels, requests_per_level: int):
+    with StubUpstream(latency=latency) as stub:
+        os.environ["PERPLEXITY_API_URL"] = stub.url
+        os.environ["GOOGLE_MAPS_API_URL"] = stub.url
+        os.environ.setdefault("PERPLEXITY_API_KEY", "bench")
+        os.environ.setdefault("GOOGLE_PLACES_API_KEY", "bench")
+        # 처리량 측정이므로 속도 제한은 끔
+        for name in ("CLIENT_RATE_LIMIT", "UPSTREAM_RATE_LIMIT_PERPLEXITY", "UPSTREAM_RATE_LIMIT_GOOGLE"):
+            os.environ.setdefault(name, "0")
+
+        from api.app import app
+
+        counter = itertools.count()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            print(f"upstream latency {latency:.2f}s, {requests_per_level} requests per level")
+            for concurrency in levels:
+                elapsed = await _drive(client, concurrency, requests_per_level, counter)
+                print(f"concurrency {concurrency:4d}: {requests_per_level / elapsed:8.2f} req/s "
+                      f"({elapsed:.2f}s total)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="upstream latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=50, help="requests per concurrency level")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    asyncio.run(main(args.latency, args.concurrency, args.requests))
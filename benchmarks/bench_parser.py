@@ -0,0 +1,87 @@
+"""
+Correctness and speed of api.response_parser against the original parser.
+
+Usage:
+    python -m benchmarks.bench_parser [--number 2000] [--log-level INFO]
+
+Every response in corpus/responses.json is parsed by both implementations.
+Outputs must match unless the corpus entry documents the difference in
+"legacy_differs". Per-variant parse time and peak allocation are reported
+for both parsers. Exits non-zero on an undocumented mismatch.
+
+The same comparison runs as parametrized assertions (and pytest-benchmark
+groups) in tests/test_response_parser.py; this script prints one table.
+
+By default logging is disabled so only parsing work is timed; pass
+--log-level INFO to include the cost of the log calls each parser makes
+(records are formatted and written to os.devnull).
+"""
+import os
+import sys
+import json
+import timeit
+import logging
+import argparse
+import tracemalloc
+
+from api.response_parser import parse_combined_response
+from .legacy_parser import LegacyParser
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus", "responses.json")
+
+
+def peak_allocation(fn, text: str) -> int:
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(number: int) -> int:
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    legacy = LegacyParser()._parse_combined_response
+    failures = 0
+
+    print(f"{'variant':28} {'match':>7} {'legacy us':>10} {'new us':>9} {'speedup':>8} {'legacy KiB':>11} {'new KiB':>8}")
+    for case in corpus:
+        text = case["text"]
+        expected, actual = legacy(text), parse_combined_response(text)
+        if expected == actual:
+            match = "yes"
+        elif "legacy_differs" in case:
+            match = "known"
+        else:
+            match = "NO"
+            failures += 1
+
+        legacy_time = timeit.timeit(lambda: legacy(text), number=number) / number * 1e6
+        new_time = timeit.timeit(lambda: parse_combined_response(text), number=number) / number * 1e6
+        speedup = legacy_time / new_time if new_time else float("inf")
+        print(f"{case['name']:28} {match:>7} {legacy_time:10.1f} {new_time:9.1f} {speedup:7.1f}x "
+              f"{peak_allocation(legacy, text) / 1024:11.1f} {peak_allocation(parse_combined_response, text) / 1024:8.1f}")
+
+        if match == "NO":
+            print(f"  legacy: {expected}\n  new:    {actual}")
+
+    for case in corpus:
+        if "legacy_differs" in case:
+            print(f"known difference in {case['name']}: {case['legacy_differs']}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000, help="parses per timing sample")
+    parser.add_argument("--log-level", default=None, help="enable logging at this level while timing")
+    args = parser.parse_args()
+
+    if args.log_level:
+        logging.basicConfig(level=args.log_level.upper(), stream=open(os.devnull, "w"))
+        logging.getLogger("benchmarks.legacy_parser").disabled = False
+    else:
+        logging.disable(logging.CRITICAL)
+    sys.exit(main(args.number))
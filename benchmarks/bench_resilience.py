@@ -0,0 +1,98 @@
+"""
+Retry, hedging and circuit-breaker behaviour against a faulty upstream.
+
+Usage:
+    python -m benchmarks.bench_resilience [--calls 200] [--concurrency 10]
+
+Each scenario starts a fresh stub Perplexity server with injected
+failures or stalls and compares the client with and without the
+relevant mechanism:
+
+  flaky   30% of completions return 503: success rate without / with retries
+  tail    10% of completions stall for 1s: p50/p95/p99 without / with hedging
+  outage  every completion fails: upstream calls made and fail-fast latency
+          once the breaker opens
+"""
+import os
+import time
+import asyncio
+import argparse
+import logging
+
+from .stub_upstream import StubUpstream
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def _run(service, calls: int, concurrency: int, **kwargs):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, results = [], []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            results.append(await service.query_perplexity(f"query {i}", **kwargs))
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return latencies, sum(1 for result in results if result)
+
+
+async def _scenario(stub_kwargs, env, calls, concurrency, **call_kwargs):
+    from api.cache import TTLCache
+    from api.http_client import close_http_client
+    from api.perplexity_service import PerplexityService
+
+    with StubUpstream(**stub_kwargs) as stub:
+        os.environ.update(env, PERPLEXITY_API_URL=stub.url)
+        service = PerplexityService(cache=TTLCache())
+        try:
+            latencies, successes = await _run(service, calls, concurrency, **call_kwargs)
+        finally:
+            await close_http_client()
+        return latencies, successes, stub, service
+
+
+async def main(calls: int, concurrency: int):
+    os.environ.setdefault("PERPLEXITY_API_KEY", "bench")
+    # 시나리오 간 차단기가 간섭하지 않도록 기본값은 관대하게
+    base_env = {"PERPLEXITY_BREAKER_FAILURE_RATIO": "0.9", "PERPLEXITY_RETRY_BASE_DELAY": "0.05"}
+
+    print(f"flaky upstream (30% 503), {calls} calls")
+    for label, retries in (("no retries", 0), ("retries=2", 2)):
+        _, successes, stub, _ = await _scenario(
+            {"latency": 0.05, "failure_rate": 0.3, "seed": 1}, base_env, calls, concurrency, max_retries=retries
+        )
+        print(f"  {label:12s} success {successes / calls:6.1%}  upstream calls {stub.requests}")
+
+    print(f"tail latency (10% stall 1s), {calls} calls")
+    for label, hedging in (("no hedging", "False"), ("hedging", "True")):
+        latencies, _, stub, service = await _scenario(
+            {"latency": 0.05, "slow_rate": 0.1, "slow_latency": 1.0, "seed": 2},
+            {**base_env, "PERPLEXITY_HEDGING": hedging}, calls, concurrency, max_retries=0
+        )
+        print(f"  {label:12s} p50 {_percentile(latencies, 0.5):.3f}s  p95 {_percentile(latencies, 0.95):.3f}s  "
+              f"p99 {_percentile(latencies, 0.99):.3f}s  upstream calls {stub.requests}")
+
+    print(f"outage (100% 503), {calls} calls")
+    latencies, successes, stub, service = await _scenario(
+        {"latency": 0.05, "failure_rate": 1.0},
+        {**base_env, "PERPLEXITY_BREAKER_FAILURE_RATIO": "0.5", "PERPLEXITY_BREAKER_MIN_REQUESTS": "10"},
+        calls, concurrency
+    )
+    breaker = service.resilience_stats()["breaker"]
+    print(f"  upstream calls {stub.requests} for {calls} requests, breaker {breaker['state']}, "
+          f"rejected {breaker['rejected']}, p50 {_percentile(latencies, 0.5) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    asyncio.run(main(args.calls, args.concurrency))
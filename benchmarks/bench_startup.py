@@ -0,0 +1,85 @@
+"""
+Cold-start cost: import time of api.app and latency of the first requests.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 5]
+
+Every run is a fresh interpreter, so nothing is shared between runs.
+Templates are measured compiled on demand and precompiled (built into a
+temporary directory with `python -m api.templating build`).
+"""
+import os
+import sys
+import json
+import tempfile
+import argparse
+import statistics
+import subprocess
+
+# 새 인터프리터에서 실행: 임포트 시간과 첫 요청 지연을 ms 단위로 출력
+_PROBE = r"""
+import json, time, asyncio, logging
+start = time.perf_counter()
+import api.app
+import_ms = (time.perf_counter() - start) * 1000
+logging.disable(logging.CRITICAL)
+import httpx
+
+async def probe():
+    timings = {"import": import_ms}
+    transport = httpx.ASGITransport(app=api.app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label, method, path, data in (
+            ("first /", "GET", "/", None),
+            ("first /form", "GET", "/form", None),
+            ("form error", "POST", "/recommend", {"symptoms": ""}),
+            ("first css", "GET", api.app.static_assets.url("css/style.css"), None),
+            ("second /", "GET", "/", None),
+        ):
+            start = time.perf_counter()
+            response = await client.request(method, path, data=data)
+            response.raise_for_status()
+            timings[label] = (time.perf_counter() - start) * 1000
+    return timings
+
+print(json.dumps(asyncio.run(probe())))
+"""
+
+
+def _run_probe(env) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _measure(env, runs: int) -> dict:
+    samples = [_run_probe(env) for _ in range(runs)]
+    return {label: statistics.median(sample[label] for sample in samples) for label in samples[0]}
+
+
+def main(runs: int):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as precompiled:
+        base_env = {**os.environ, "PYTHONPATH": root, "LOG_LEVEL": "WARNING"}
+        on_demand_env = {**base_env, "TEMPLATES_PRECOMPILED_DIR": os.path.join(precompiled, "missing")}
+        precompiled_env = {**base_env, "TEMPLATES_PRECOMPILED_DIR": precompiled}
+        subprocess.run([sys.executable, "-m", "api.templating", "build"], env=precompiled_env,
+                       cwd=root, check=True, capture_output=True)
+
+        results = {
+            "on-demand": _measure(on_demand_env, runs),
+            "precompiled": _measure(precompiled_env, runs),
+        }
+
+    print(f"median of {runs} cold starts (ms)")
+    print(f"{'':14s}{'on-demand':>12s}{'precompiled':>14s}")
+    for label in results["on-demand"]:
+        print(f"{label:14s}{results['on-demand'][label]:12.1f}{results['precompiled'][label]:14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    main(args.runs)
@@ -0,0 +1,117 @@
+"""
+Offline evaluation of near-duplicate cache matching (api.similarity).
+
+Usage:
+    python -m benchmarks.eval_similarity [--log corpus/requests.jsonl]
+        [--thresholds 1.0 0.9 0.8 0.7 0.6 0.5]
+
+Replays a request log in order through an exact-key cache plus a
+SimilarityIndex, once per threshold. Each line of the log is a JSON
+object with symptoms, gender, age and allergic, and optionally the
+medications that request was actually given. A request whose key was
+seen before is an exact hit; otherwise a near match above the threshold
+is a semantic hit, and anything else is a miss that gets cached.
+
+Hit-rate gain is the share of requests served by semantic hits. Drift is
+1 - Jaccard similarity between the medications of the matched entry and
+the medications recorded for the request itself; without recorded
+medications only hit rates are reported. The bundled corpus is
+synthetic, so run it on a real request log before changing the default
+threshold.
+
+Requests with a symptom the nearest cached profile lacks are never
+served from it (see api.similarity). The "superset" columns count the
+misses that plain cosine similarity would have served anyway, and the
+drift those answers would have had.
+"""
+import os
+import json
+import argparse
+from typing import Any, Dict, List
+
+from api.cache_keys import SymptomProfile
+from api.similarity import SimilarityIndex
+
+DEFAULT_LOG = os.path.join(os.path.dirname(__file__), "corpus", "requests.jsonl")
+
+
+def load_log(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _profile(record: Dict[str, Any]) -> SymptomProfile:
+    symptoms = record["symptoms"]
+    if isinstance(symptoms, str):
+        symptoms = symptoms.split(",")
+    return SymptomProfile.from_request(
+        symptoms, record.get("gender", "not specified"), record.get("age", "not specified"),
+        record.get("allergic", "none"),
+    )
+
+
+def _drift(served, expected) -> float:
+    served, expected = set(served), set(expected)
+    union = served | expected
+    return 1 - len(served & expected) / len(union) if union else 0.0
+
+
+def evaluate(records: List[Dict[str, Any]], threshold: float) -> Dict[str, Any]:
+    index = SimilarityIndex(threshold=threshold, max_entries=len(records) or 1)
+    answers: Dict[str, Any] = {}
+    exact = semantic = superset = 0
+    drifts, superset_drifts = [], []
+    for record in records:
+        profile = _profile(record)
+        key = profile.cache_key
+        if key in answers:
+            exact += 1
+            continue
+        match = index.nearest(profile)
+        if match is not None:
+            semantic += 1
+            if answers[match.cache_key] is not None and record.get("medications") is not None:
+                drifts.append(_drift(answers[match.cache_key], record["medications"]))
+            continue
+        # 추가 증상이 있어 거절된 매칭: 코사인만 썼다면 나갔을 답변의 차이
+        loose = index.nearest(profile, covering=False)
+        if loose is not None:
+            superset += 1
+            if answers[loose.cache_key] is not None and record.get("medications") is not None:
+                superset_drifts.append(_drift(answers[loose.cache_key], record["medications"]))
+        answers[key] = record.get("medications")
+        index.add(profile, key)
+
+    total = len(records) or 1
+    return {
+        "threshold": threshold,
+        "exact_hit_rate": exact / total,
+        "semantic_hit_rate": semantic / total,
+        "upstream_calls": len(answers),
+        "mean_drift": sum(drifts) / len(drifts) if drifts else None,
+        "drifted": sum(1 for drift in drifts if drift > 0.5),
+        "superset_rate": superset / total,
+        "superset_drift": sum(superset_drifts) / len(superset_drifts) if superset_drifts else None,
+    }
+
+
+def main(log_path: str, thresholds: List[float]):
+    records = load_log(log_path)
+    print(f"{len(records)} requests from {log_path}")
+    print(f"{'threshold':>10s}{'exact':>9s}{'semantic':>10s}{'calls':>7s}{'drift':>8s}{'drift>0.5':>11s}"
+          f"{'superset':>10s}{'sup.drift':>11s}")
+    for threshold in thresholds:
+        result = evaluate(records, threshold)
+        drift = "-" if result["mean_drift"] is None else f"{result['mean_drift']:.3f}"
+        superset_drift = "-" if result["superset_drift"] is None else f"{result['superset_drift']:.3f}"
+        print(f"{threshold:10.2f}{result['exact_hit_rate']:9.1%}{result['semantic_hit_rate']:10.1%}"
+              f"{result['upstream_calls']:7d}{drift:>8s}{result['drifted']:11d}"
+              f"{result['superset_rate']:10.1%}{superset_drift:>11s}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=DEFAULT_LOG)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[1.0, 0.9, 0.8, 0.7, 0.6, 0.5])
+    args = parser.parse_args()
+    main(args.log, args.thresholds)
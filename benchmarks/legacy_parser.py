@@ -0,0 +1,173 @@
+"""
+Frozen copy of the original PerplexityService parsing methods.
+
+Used by bench_parser.py as the reference implementation when checking
+the single-pass parser in api/response_parser.py. Its logger is disabled
+unless the benchmark is run with --log-level.
+"""
+import re
+import logging
+from typing import List, Dict, Any, Tuple
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+logger.disabled = True
+
+
+class LegacyParser:
+    def _parse_combined_response(self, response_text: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+        """Parse the combined response into medications and management lists."""
+        try:
+            logger.info("Starting to parse combined response...")
+            
+            # Split response into medications and management sections
+            sections = response_text.split("MANAGEMENT:")
+            if len(sections) != 2:
+                logger.error("Could not split response into medications and management sections")
+                return [], {"to_do_list": [], "do_not_list": []}
+                
+            medications_text, management_text = sections
+            
+            # Parse medications
+            medications = self.parse_medication_recommendations(medications_text.replace("MEDICATIONS:", "").strip())
+            
+            # Parse management lists
+            management_lists = self.parse_management_lists(management_text.strip())
+            
+            return medications, management_lists
+            
+        except Exception as e:
+            logger.exception(f"Error parsing combined response: {e}")
+            return [], {"to_do_list": [], "do_not_list": []}
+    
+    def parse_medication_recommendations(self, response_text: str) -> List[Dict[str, Any]]:
+        """Extract medication recommendations from Perplexity response."""
+        medications = []
+        try:
+            # Remove ** characters from the response
+            cleaned_text = response_text.replace('*', '')
+            
+            # Split recommendations by numbered items
+            medication_sections = re.split(r'\n\s*\d+\.\s*', cleaned_text)
+            medication_sections = [s.strip() for s in medication_sections if s.strip()]
+            rank = 1
+
+            for section in medication_sections[:3]:  # Process max 3 items
+                if not section.strip() or "none recommended" in section.lower():
+                    continue
+
+                medication_info = {
+                    "rank": rank,
+                    "name": None,
+                    "medication_type": None,
+                    "side_effects": "Not available",
+                }
+
+                # Extract brand name with generic name in parentheses
+                name_match = re.search(r'brand name:?\s*([^:\n]+)', section, re.IGNORECASE)
+                if name_match:
+                    name = name_match.group(1).strip()
+                    medication_info["name"] = name
+
+                # Extract medication form
+                form_match = re.search(r'form:?\s*([^:\n]+)', section, re.IGNORECASE)
+                if form_match:
+                    medication_form = form_match.group(1).strip()
+                    medication_info["medication_type"] = medication_form
+
+                # Extract side effects
+                side_effects_match = re.search(r'side effects:?\s*([^\n]+(?:\n\s+[^\n]+)*)', section, re.IGNORECASE)
+                if side_effects_match:
+                    side_effects = side_effects_match.group(1).strip()
+                    medication_info["side_effects"] = side_effects
+
+                # Add medication if name is present
+                if medication_info["name"]:
+                    pharmacy_links = self.create_pharmacy_links(medication_info["name"])
+                    medication_info.update(pharmacy_links)
+                    medications.append(medication_info)
+                    rank += 1
+                else:
+                    logger.warning(f"Skipping medication due to missing name: {section}")
+
+            if not medications:
+                logger.error(f"No medications found in response: {cleaned_text}")
+
+            return medications
+        except Exception as e:
+            logger.exception(f"Error parsing medication recommendations: {e}, response_text: {response_text}")
+            return []
+        
+    def create_pharmacy_links(self, medication_name):
+        """Create pharmacy links for a medication"""
+        # Clean up the medication name for search
+        search_term = re.sub(r'\([^)]*\)', '', medication_name).strip()
+        # Remove brand designations like "Extra Strength"
+        search_term = re.sub(r'(?:extra strength|maximum strength|children\'s|infant\'s)', '', search_term, flags=re.IGNORECASE).strip()
+        encoded_search = quote(search_term)
+        
+        return {
+            "cvs_link": f"https://www.cvs.com/search?searchTerm={encoded_search}",
+            #"walgreens_link": f"https://www.walgreens.com/search/results.jsp?Ntt={encoded_search}",
+        }
+
+    def parse_management_lists(self, response_text: str) -> Dict[str, List[str]]:
+        """Parse the response text into to-do list and do-not list."""
+        result = {
+            "to_do_list": [],
+            "do_not_list": []
+        }
+        
+        try:
+            # Remove ** characters from the response
+            cleaned_text = response_text.replace('*', '')
+            logger.info(f"Cleaned response text: {cleaned_text}")
+
+            # First try to find DO section with more flexible pattern
+            do_match = re.search(r'DO:[\s\n]*((?:\d+\.[^\n]+\n?)+)', cleaned_text, re.IGNORECASE)
+            if do_match:
+                do_section = do_match.group(1)
+                logger.info(f"Found DO section: {do_section}")
+                do_items = re.findall(r'\d+\.\s*([^\n]+)', do_section)
+                logger.info(f"Extracted DO items: {do_items}")
+                
+                # Clean up items and limit to 3
+                cleaned_items = []
+                for item in do_items[:3]:
+                    if item.strip():
+                        # Remove reference numbers and special characters
+                        item = re.sub(r'\[\d+\](?:\[\d+\])*', '', item)
+                        item = re.sub(r'[^\w\s.,()-]', '', item)
+                        cleaned_items.append(item.strip())
+                result["to_do_list"] = cleaned_items
+                logger.info(f"Final DO items: {result['to_do_list']}")
+            else:
+                logger.warning("Could not find DO section in response")
+
+            # Then try to find DON'T section with more flexible pattern
+            dont_match = re.search(r"DON'?T:[\s\n]*((?:\d+\.[^\n]+\n?)+)", cleaned_text, re.IGNORECASE)
+            if dont_match:
+                dont_section = dont_match.group(1)
+                logger.info(f"Found DON'T section: {dont_section}")
+                dont_items = re.findall(r'\d+\.\s*([^\n]+)', dont_section)
+                logger.info(f"Extracted DON'T items: {dont_items}")
+                
+                # Clean up items and limit to 3
+                cleaned_items = []
+                for item in dont_items[:3]:
+                    if item.strip():
+                        # Remove reference numbers and special characters
+                        item = re.sub(r'\[\d+\](?:\[\d+\])*', '', item)
+                        item = re.sub(r'[^\w\s.,()-]', '', item)
+                        cleaned_items.append(item.strip())
+                result["do_not_list"] = cleaned_items
+                logger.info(f"Final DON'T items: {result['do_not_list']}")
+            else:
+                logger.warning("Could not find DON'T section in response")
+
+            return result
+            
+        except Exception as e:
+            logger.exception(f"Error parsing management lists: {e}")
+            logger.error(f"Failed response text: {response_text}")
+            return result
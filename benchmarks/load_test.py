@@ -0,0 +1,403 @@
+"""
+Load test of the whole app against local upstream stand-ins.
+
+Usage:
+    python -m benchmarks.load_test [--concurrency 20] [--duration 20]
+        [--latency 0.3 --latency-distribution lognormal]
+        [--failure-rate 0.05] [--maps-failure-rate 0.02]
+        [--mix recommend=3,pharmacies=2,health=1] [--profiles 40]
+    python -m benchmarks.load_test --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+The stub Perplexity and Google servers run in this process; the app runs
+under uvicorn in a child process so the driver does not compete with it
+for the GIL or the event loop. A monitor task inside the app's loop
+sleeps for a fixed interval and records how late it wakes up: that lag
+is time the loop spent blocked by synchronous work.
+
+/recommend draws from a fixed pool of symptom profiles, so once the pool
+has been seen requests are served from the cache; --profiles controls
+the hit rate. Results (throughput, p50/p95/p99 per route, cache hit
+rates, loop lag) are written to benchmarks/results/<commit>.json so runs
+on different commits can be compared with --compare.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+LOOP_STATS_PATH = "/__loadtest/loop"
+SYMPTOMS = (
+    "cough", "fever", "headache", "sore throat", "runny nose", "nausea",
+    "muscle aches", "fatigue", "congestion", "sneezing", "diarrhea", "rash",
+)
+ZIPCODES = ("95132", "95014", "94103", "10001", "60601", "73301", "98101", "02108")
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ("recommend", "pharmacies", "health"):
+            raise argparse.ArgumentTypeError(f"unknown route in mix: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class LoopMonitor:
+    """Measure event-loop lag by oversleeping a fixed interval"""
+
+    def __init__(self, interval: float = 0.01, threshold: float = 0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.samples: List[float] = []
+        self.blocked = 0.0
+        self.started = time.monotonic()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.samples.append(lag)
+            # 임계값을 넘는 지연만 '블로킹'으로 합산
+            if lag > self.threshold:
+                self.blocked += lag
+
+    def stats(self) -> Dict[str, float]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "samples": len(self.samples),
+            "lag_p50_ms": _percentile(self.samples, 0.5) * 1000,
+            "lag_p99_ms": _percentile(self.samples, 0.99) * 1000,
+            "lag_max_ms": max(self.samples, default=0.0) * 1000,
+            "blocked_ms": self.blocked * 1000,
+            "blocked_fraction": self.blocked / elapsed if elapsed else 0.0,
+        }
+
+
+def serve(port: int):
+    """Child process: the app plus a loop monitor and its stats route"""
+    from api.app import app
+    import uvicorn
+
+    monitor = LoopMonitor()
+    tasks = []
+
+    async def start_loop_monitor():
+        tasks.append(asyncio.create_task(monitor.run()))
+
+    app.router.add_event_handler("startup", start_loop_monitor)
+
+    @app.get(LOOP_STATS_PATH, include_in_schema=False)
+    async def loop_stats(reset: bool = False):
+        stats = monitor.stats()
+        if reset:
+            monitor.reset()
+        return stats
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def _start_app(stub_url: str, port: int, env_overrides: Dict[str, str]) -> subprocess.Popen:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {
+        **os.environ,
+        "PYTHONPATH": root,
+        "PERPLEXITY_API_URL": stub_url,
+        "GOOGLE_MAPS_API_URL": stub_url,
+        "PERPLEXITY_API_KEY": "loadtest",
+        "GOOGLE_PLACES_API_KEY": "loadtest",
+        "RECOMMENDATION_CACHE_BACKEND": "memory",
+        "LOG_LEVEL": "WARNING",
+        # 모든 요청이 한 클라이언트에서 오므로 속도 제한은 기본적으로 끔 (--env로 켤 수 있음)
+        "CLIENT_RATE_LIMIT": "0",
+        "UPSTREAM_RATE_LIMIT_PERPLEXITY": "0",
+        "UPSTREAM_RATE_LIMIT_GOOGLE": "0",
+        **env_overrides,
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.load_test", "--serve", str(port)], cwd=root, env=env
+    )
+
+
+async def _wait_until_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app exited with status {process.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("app did not become ready")
+
+
+class Workload:
+    """Weighted route mix over a fixed pool of profiles and ZIP codes"""
+
+    def __init__(self, mix: Dict[str, float], profiles: int, seed: int):
+        self._random = random.Random(seed)
+        self._routes = list(mix)
+        self._weights = [mix[route] for route in self._routes]
+        self.profiles = [self._profile(i) for i in range(profiles)]
+
+    def _profile(self, i: int) -> Dict[str, str]:
+        symptoms = self._random.sample(SYMPTOMS, self._random.randint(1, 3))
+        return {
+            "symptoms": ", ".join(symptoms + [f"variant {i}"]),
+            "gender": self._random.choice(("female", "male", "not specified")),
+            "age": str(self._random.randint(5, 80)),
+            "allergic": self._random.choice(("none", "penicillin")),
+        }
+
+    async def request(self, client: httpx.AsyncClient):
+        route = self._random.choices(self._routes, self._weights)[0]
+        if route == "recommend":
+            return route, await client.post("/recommend", data=self._random.choice(self.profiles))
+        if route == "pharmacies":
+            return route, await client.get("/api/pharmacies", params={"zipcode": self._random.choice(ZIPCODES)})
+        return route, await client.get("/health")
+
+
+async def _drive(client: httpx.AsyncClient, workload: Workload, concurrency: int, duration: float):
+    samples: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                route, response = await workload.request(client)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                route, failed = "transport", True
+            samples.setdefault(route, []).append(time.perf_counter() - start)
+            if failed:
+                errors[route] = errors.get(route, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors, time.perf_counter() - start
+
+
+def _cache_hit_rates(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    rates = {}
+    for name in ("cache", "geocode", "pharmacies"):
+        if name not in after:
+            continue
+        delta = {
+            field: after[name].get(field, 0) - before.get(name, {}).get(field, 0)
+            for field in ("hits", "stale_hits", "misses")
+        }
+        lookups = sum(delta.values())
+        rates["recommendations" if name == "cache" else name] = {
+            **delta, "hit_ratio": (delta["hits"] + delta["stale_hits"]) / lookups if lookups else 0.0,
+        }
+    return rates
+
+
+def _summarize(samples, errors, elapsed) -> Dict[str, Dict[str, float]]:
+    routes = {}
+    for route, latencies in sorted(samples.items()):
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": errors.get(route, 0),
+            "throughput": len(latencies) / elapsed,
+            "p50_ms": _percentile(latencies, 0.5) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+        }
+    all_latencies = [latency for latencies in samples.values() for latency in latencies]
+    routes["all"] = {
+        "requests": len(all_latencies),
+        "errors": sum(errors.values()),
+        "throughput": len(all_latencies) / elapsed,
+        "p50_ms": _percentile(all_latencies, 0.5) * 1000,
+        "p95_ms": _percentile(all_latencies, 0.95) * 1000,
+        "p99_ms": _percentile(all_latencies, 0.99) * 1000,
+    }
+    return routes
+
+
+def _git_revision() -> str:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{revision}-dirty" if dirty else revision
+
+
+async def run(args) -> Dict[str, Any]:
+    from .stub_upstream import StubUpstream
+
+    stub_kwargs = {
+        "latency": args.latency, "latency_distribution": args.latency_distribution,
+        "latency_sigma": args.latency_sigma, "failure_rate": args.failure_rate,
+        "maps_failure_rate": args.maps_failure_rate, "seed": args.seed,
+    }
+    with StubUpstream(**stub_kwargs) as stub:
+        process = _start_app(stub.url, args.port, dict(args.env))
+        try:
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits,
+                                         timeout=60) as client:
+                await _wait_until_ready(client, process)
+                workload = Workload(args.mix, args.profiles, args.seed)
+                if args.warmup:
+                    await _drive(client, workload, args.concurrency, args.warmup)
+
+                cache_before = (await client.get("/api/cache/stats")).json()
+                await client.get(LOOP_STATS_PATH, params={"reset": "true"})
+                samples, errors, elapsed = await _drive(client, workload, args.concurrency, args.duration)
+                loop_stats = (await client.get(LOOP_STATS_PATH)).json()
+                cache_after = (await client.get("/api/cache/stats")).json()
+        finally:
+            process.terminate()
+            process.wait()
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            **stub_kwargs, "concurrency": args.concurrency, "duration": args.duration,
+            "warmup": args.warmup, "mix": args.mix, "profiles": args.profiles, "env": dict(args.env),
+        },
+        "routes": _summarize(samples, errors, elapsed),
+        "cache": _cache_hit_rates(cache_before, cache_after),
+        "event_loop": loop_stats,
+        "upstream": {"requests": stub.requests, "failures": stub.failures},
+    }
+
+
+def _print_report(result: Dict[str, Any]):
+    print(f"revision {result['revision']}, concurrency {result['config']['concurrency']}, "
+          f"{result['config']['duration']:.0f}s, upstream {result['config']['latency']:.2f}s "
+          f"{result['config']['latency_distribution']}")
+    print(f"{'route':12s}{'requests':>10s}{'errors':>8s}{'req/s':>10s}{'p50 ms':>10s}{'p95 ms':>10s}{'p99 ms':>10s}")
+    for route, stats in result["routes"].items():
+        print(f"{route:12s}{stats['requests']:10d}{stats['errors']:8d}{stats['throughput']:10.1f}"
+              f"{stats['p50_ms']:10.1f}{stats['p95_ms']:10.1f}{stats['p99_ms']:10.1f}")
+    for name, stats in result["cache"].items():
+        print(f"cache {name:16s} hit ratio {stats['hit_ratio']:6.1%} "
+              f"({stats['hits']} hits, {stats['stale_hits']} stale, {stats['misses']} misses)")
+    loop = result["event_loop"]
+    print(f"event loop lag p50 {loop['lag_p50_ms']:.2f}ms  p99 {loop['lag_p99_ms']:.2f}ms  "
+          f"max {loop['lag_max_ms']:.2f}ms  blocked {loop['blocked_ms']:.0f}ms "
+          f"({loop['blocked_fraction']:.1%})")
+    print(f"upstream requests {result['upstream']['requests']} ({result['upstream']['failures']} injected failures)")
+
+
+def _flatten(result: Dict[str, Any]) -> Dict[str, float]:
+    flat = {}
+    for route, stats in result["routes"].items():
+        for field in ("throughput", "p50_ms", "p95_ms", "p99_ms", "errors"):
+            flat[f"{route}.{field}"] = stats[field]
+    for name, stats in result["cache"].items():
+        flat[f"cache.{name}.hit_ratio"] = stats["hit_ratio"]
+    for field in ("lag_p99_ms", "lag_max_ms", "blocked_ms"):
+        flat[f"event_loop.{field}"] = result["event_loop"][field]
+    return flat
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    if old["config"] != new["config"]:
+        print("warning: runs used different configurations; deltas may not be meaningful")
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    print(f"{'metric':34s}{old['revision']:>14s}{new['revision']:>14s}{'change':>10s}")
+    for metric in sorted(old_flat.keys() | new_flat.keys()):
+        before, after = old_flat.get(metric), new_flat.get(metric)
+        if before is None or after is None:
+            print(f"{metric:34s}{_format(before):>14s}{_format(after):>14s}")
+            continue
+        change = f"{(after - before) / before:+.1%}" if before else ""
+        print(f"{metric:34s}{_format(before):>14s}{_format(after):>14s}{change:>10s}")
+
+
+def _format(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def _save(result: Dict[str, Any], output: Optional[str]) -> str:
+    path = output or os.path.join(RESULTS_DIR, f"{result['revision']}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    return path
+
+
+def _parse_env(value: str):
+    name, _, setting = value.partition("=")
+    if not name or not _:
+        raise argparse.ArgumentTypeError("expected NAME=VALUE")
+    return name, setting
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before the run")
+    parser.add_argument("--latency", type=float, default=0.3, help="mean upstream latency in seconds")
+    parser.add_argument("--latency-distribution", default="lognormal",
+                        choices=("fixed", "uniform", "exponential", "lognormal"))
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Perplexity failure rate")
+    parser.add_argument("--maps-failure-rate", type=float, default=0.0, help="Google failure rate")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("recommend=3,pharmacies=2,health=1"))
+    parser.add_argument("--profiles", type=int, default=40, help="distinct /recommend profiles")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--env", type=_parse_env, action="append", default=[],
+                        help="extra NAME=VALUE for the app, e.g. --env PERPLEXITY_HEDGING=True")
+    parser.add_argument("--output", help=f"result file (default {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files and exit")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve)
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    from .stub_upstream import _free_port
+
+    args.port = args.port or _free_port()
+    result = asyncio.run(run(args))
+    _print_report(result)
+    print(f"saved {_save(result, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Local stand-ins for the Perplexity and Google Maps APIs.
+
+The stub answers with canned payloads after a configurable delay so the
+app can be benchmarked without network access or API keys. Completions
+can also be made to fail (failure_rate / failure_status) or to stall
+(slow_rate / slow_latency) to exercise retries, hedging and the circuit
+breaker.
+
+Latencies are fixed by default; latency_distribution picks "uniform"
+(0 to 2x), "exponential" or "lognormal" (spread set by latency_sigma)
+around the same mean so tail behaviour can be exercised. Google calls
+fail independently with maps_failure_rate.
+"""
+import random
+import socket
+import asyncio
+import threading
+import time
+
+import json
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+SAMPLE_COMPLETION = """MEDICATIONS:
+1. **Brand name:** Tylenol (acetaminophen)
+Form: tablet
+Side effects: nausea, rash [1]
+
+2. Brand name: Advil (ibuprofen)
+Form: capsule
+Side effects: stomach upset[2][3]
+
+3. Brand name: Mucinex (guaifenesin)
+Form: tablet
+Side effects: dizziness, headache
+
+MANAGEMENT:
+DO:
+1. Get plenty of rest [1]
+2. Drink **fluids** regularly
+3. Use a humidifier
+
+DON'T:
+1. Smoke or be around smoke
+2. Drink alcohol[2]
+3. Skip meals
+"""
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+class StubUpstream:
+    """Serve fake upstream APIs from a background thread"""
+
+    def __init__(self, latency: float = 0.5, failure_rate: float = 0.0, failure_status: int = 503,
+                 slow_rate: float = 0.0, slow_latency: float = 0.0, seed: int = 0,
+                 latency_distribution: str = "fixed", latency_sigma: float = 0.5,
+                 maps_failure_rate: float = 0.0):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.maps_failure_rate = maps_failure_rate
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self.port = _free_port()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _sample_latency(self) -> float:
+        # 모든 분포의 평균은 latency로 동일
+        if self.latency <= 0 or self.latency_distribution == "fixed":
+            return self.latency
+        if self.latency_distribution == "uniform":
+            return self._random.uniform(0, 2 * self.latency)
+        if self.latency_distribution == "exponential":
+            return self._random.expovariate(1 / self.latency)
+        sigma = self.latency_sigma
+        return self.latency * self._random.lognormvariate(-sigma * sigma / 2, sigma)
+
+    async def _delay(self):
+        self.requests += 1
+        await asyncio.sleep(self._sample_latency())
+
+    async def _maps_failure(self):
+        if self._random.random() >= self.maps_failure_rate:
+            return None
+        self.requests += 1
+        self.failures += 1
+        await asyncio.sleep(self.latency / 10)
+        return JSONResponse({"error": "injected failure"}, status_code=self.failure_status)
+
+    async def chat_completions(self, request):
+        payload = await request.json()
+        if self._random.random() < self.failure_rate:
+            self.requests += 1
+            self.failures += 1
+            await asyncio.sleep(self.latency / 10)
+            return JSONResponse({"error": "injected failure"}, status_code=self.failure_status)
+        if payload.get("stream"):
+            return StreamingResponse(self._stream_completion(), media_type="text/event-stream")
+        await self._delay()
+        if self._random.random() < self.slow_rate:
+            await asyncio.sleep(self.slow_latency)
+        return JSONResponse({"choices": [{"message": {"content": SAMPLE_COMPLETION}}]})
+
+    async def _stream_completion(self):
+        """Spread the canned completion over the configured latency"""
+        self.requests += 1
+        lines = SAMPLE_COMPLETION.splitlines(keepends=True)
+        latency = self._sample_latency()
+        for line in lines:
+            await asyncio.sleep(latency / len(lines))
+            chunk = {"choices": [{"delta": {"content": line}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def geocode(self, request):
+        failure = await self._maps_failure()
+        if failure is not None:
+            return failure
+        await self._delay()
+        return JSONResponse({
+            "status": "OK",
+            "results": [{"geometry": {"location": {"lat": 37.3861, "lng": -121.8867}}}],
+        })
+
+    async def nearby_search(self, request):
+        failure = await self._maps_failure()
+        if failure is not None:
+            return failure
+        await self._delay()
+        return JSONResponse({
+            "status": "OK",
+            "results": [
+                {"name": f"Pharmacy {i}", "vicinity": f"{100 + i} Main St",
+                 "geometry": {"location": {"lat": 37.3861 + i * 0.002, "lng": -121.8867 - i * 0.001}},
+                 "opening_hours": {"open_now": i % 2 == 0}}
+                for i in range(8)
+            ],
+        })
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/chat/completions", self.chat_completions, methods=["POST"]),
+            Route("/geocode/json", self.geocode),
+            Route("/place/nearbysearch/json", self.nearby_search),
+        ])
+
+    def start(self):
+        config = uvicorn.Config(self.app(), host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,49 @@
+"""
+SQLiteCache write batching, inside and outside an event loop.
+"""
+import asyncio
+import threading
+
+from api.cache import SQLiteCache
+
+
+def test_flushes_inline_without_event_loop(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), batch_size=4)
+    for i in range(4):
+        cache.set(f"key {i}", f"value {i}")
+
+    assert cache.stats()["pending"] == 0
+    assert cache.stats()["entries"] == 4
+    cache.close()
+
+
+def test_flushes_off_the_event_loop(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), batch_size=4)
+    flushed_on = []
+    flush = cache.flush
+
+    def recording_flush():
+        flushed_on.append(threading.current_thread())
+        flush()
+
+    cache.flush = recording_flush
+
+    async def main():
+        for i in range(10):
+            cache.set(f"key {i}", f"value {i}")
+        # 커밋 전에도 이 프로세스에서는 보임
+        assert cache.get("key 9") == "value 9"
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+
+    assert flushed_on and threading.main_thread() not in flushed_on
+    assert cache.stats()["entries"] == 10
+    cache.delete("key 0")
+    assert cache.get("key 0") is None
+    cache.close()
+
+    reopened = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    assert reopened.get("key 0") is None
+    assert reopened.get("key 9") == "value 9"
+    reopened.close()
@@ -0,0 +1,297 @@
+"""
+Retry, hedging, circuit breaking and call coalescing against the stub
+upstream.
+
+Each test runs its own event loop (asyncio.run) and closes the shared
+HTTP client before the loop ends.
+"""
+import time
+import asyncio
+
+import pytest
+
+from api.http_client import close_http_client
+from api.cache import TTLCache
+from api.perplexity_service import PerplexityService
+from api.rate_limit import get_upstream_rate_limiter
+from api.resilience import CircuitBreaker, hedged
+from benchmarks.stub_upstream import StubUpstream
+
+RESET_TIMEOUT = 0.2
+
+
+@pytest.fixture
+def stub():
+    with StubUpstream(latency=0.01, seed=1) as upstream:
+        yield upstream
+
+
+@pytest.fixture
+def make_service(stub, monkeypatch):
+    def make(**env):
+        monkeypatch.setenv("PERPLEXITY_API_URL", stub.url)
+        monkeypatch.setenv("PERPLEXITY_API_KEY", "test")
+        monkeypatch.setenv("PERPLEXITY_RETRY_BASE_DELAY", "0.01")
+        monkeypatch.setenv("PERPLEXITY_BREAKER_RESET_TIMEOUT", str(RESET_TIMEOUT))
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return PerplexityService(cache=TTLCache())
+    return make
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await close_http_client()
+    return asyncio.run(main())
+
+
+def _open_breaker(service, stub):
+    """Fail enough calls to open the breaker, then heal the stub"""
+    stub.failure_rate = 1.0
+    for i in range(4):
+        assert run(service.query_perplexity(f"outage {i}", max_retries=0)) is None
+    assert service.resilience_stats()["breaker"]["state"] == CircuitBreaker.OPEN
+    stub.failure_rate = 0.0
+
+
+def test_retry_eventually_succeeds(stub, make_service):
+    service = make_service(PERPLEXITY_BREAKER_MIN_REQUESTS="1000")
+    stub.failure_rate = 0.3
+
+    results = [run(service.query_perplexity(f"query {i}", max_retries=5)) for i in range(10)]
+
+    assert all(results)
+    assert stub.failures > 0
+    assert stub.requests == len(results) + stub.failures
+
+
+def test_no_retries_surfaces_failures(stub, make_service):
+    service = make_service(PERPLEXITY_BREAKER_MIN_REQUESTS="1000")
+    stub.failure_rate = 1.0
+
+    assert run(service.query_perplexity("query", max_retries=0)) is None
+    assert stub.requests == 1
+
+
+def test_retries_share_one_deadline(stub, make_service):
+    service = make_service(PERPLEXITY_BREAKER_MIN_REQUESTS="1000")
+    stub.latency = 1.0
+
+    start = time.perf_counter()
+    assert run(service.query_perplexity("slow", max_retries=2, timeout=0.3, deadline=0.5)) is None
+    elapsed = time.perf_counter() - start
+
+    # 0.3초 시도 후 남은 0.2초로는 또 한 번의 시도를 할 수 없음
+    assert elapsed < 0.45
+    assert stub.requests == 1
+
+
+def test_retries_are_charged_to_upstream_limiter(stub, make_service, monkeypatch):
+    monkeypatch.setenv("UPSTREAM_RATE_LIMIT_PERPLEXITY", "0.001")
+    monkeypatch.setenv("UPSTREAM_RATE_BURST_PERPLEXITY", "1")
+    get_upstream_rate_limiter.cache_clear()
+    try:
+        service = make_service(PERPLEXITY_BREAKER_MIN_REQUESTS="1000")
+        stub.failure_rate = 1.0
+        assert run(service.query_perplexity("query", max_retries=3)) is None
+    finally:
+        get_upstream_rate_limiter.cache_clear()
+
+    # 첫 재시도가 마지막 토큰을 쓰고 두 번째 재시도는 건너뜀
+    assert stub.requests == 2
+
+
+def test_losing_hedge_is_cancelled():
+    cancelled = []
+    calls = []
+
+    async def call():
+        attempt = len(calls)
+        calls.append(attempt)
+        try:
+            # 첫 호출은 느리고 두 번째(헤지) 호출은 빠름
+            await asyncio.sleep(1.0 if attempt == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return attempt
+
+    async def main():
+        result = await hedged(call, delay=0.05)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == 1
+    assert calls == [0, 1]
+    assert cancelled == [0]
+
+
+def test_fast_call_is_not_hedged():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "ok"
+
+    assert asyncio.run(hedged(call, delay=0.05)) == "ok"
+    assert len(calls) == 1
+
+
+def test_hedge_skipped_when_not_admitted():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    assert asyncio.run(hedged(call, delay=0.01, may_hedge=lambda: False)) == "ok"
+    assert len(calls) == 1
+
+
+def test_cancelled_caller_cancels_first_call():
+    cancelled = []
+
+    async def call():
+        try:
+            await asyncio.sleep(1.0)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def main():
+        caller = asyncio.create_task(hedged(call, delay=0.5))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == [1]
+
+
+def test_client_errors_do_not_open_breaker(stub, make_service):
+    service = make_service(PERPLEXITY_BREAKER_MIN_REQUESTS="4")
+    stub.failure_rate = 1.0
+    stub.failure_status = 400
+
+    for i in range(6):
+        assert run(service.query_perplexity(f"bad request {i}", max_retries=0)) is None
+
+    stats = service.resilience_stats()["breaker"]
+    assert stats["state"] == CircuitBreaker.CLOSED
+    assert stats["window_failures"] == 0
+
+
+def test_breaker_closed_open_half_open_closed(stub, make_service):
+    service = make_service(PERPLEXITY_BREAKER_MIN_REQUESTS="4", PERPLEXITY_BREAKER_FAILURE_RATIO="0.5")
+    assert service.resilience_stats()["breaker"]["state"] == CircuitBreaker.CLOSED
+
+    _open_breaker(service, stub)
+    calls = stub.requests
+    assert run(service.query_perplexity("while open", max_retries=0)) is None
+    assert stub.requests == calls, "open breaker must not call the upstream"
+
+    time.sleep(RESET_TIMEOUT)
+    breaker = service._breaker
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request(), "only one probe while half-open"
+    breaker.release_probe()
+
+    assert run(service.query_perplexity("probe", max_retries=0))
+    assert service.resilience_stats()["breaker"]["state"] == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens(stub, make_service):
+    service = make_service(PERPLEXITY_BREAKER_MIN_REQUESTS="4")
+    _open_breaker(service, stub)
+    stub.failure_rate = 1.0
+
+    time.sleep(RESET_TIMEOUT)
+    assert run(service.query_perplexity("probe", max_retries=0)) is None
+    stats = service.resilience_stats()["breaker"]
+    assert stats["state"] == CircuitBreaker.OPEN
+    assert stats["opened"] == 2
+
+
+def test_cancelled_probe_does_not_wedge_breaker(stub, make_service):
+    service = make_service(PERPLEXITY_BREAKER_MIN_REQUESTS="4")
+    _open_breaker(service, stub)
+    time.sleep(RESET_TIMEOUT)
+
+    async def cancel_probe():
+        stub.latency = 1.0
+        probe = asyncio.create_task(service.query_perplexity("slow probe", max_retries=0))
+        await asyncio.sleep(0.1)
+        assert service._breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        stub.latency = 0.01
+
+    run(cancel_probe())
+
+    assert run(service.query_perplexity("next probe", max_retries=0))
+    assert service.resilience_stats()["breaker"]["state"] == CircuitBreaker.CLOSED
+
+
+def test_cancelled_stream_probe_does_not_wedge_breaker(stub, make_service):
+    service = make_service(PERPLEXITY_BREAKER_MIN_REQUESTS="4")
+    _open_breaker(service, stub)
+    time.sleep(RESET_TIMEOUT)
+
+    async def abandon_stream():
+        stream = service.stream_perplexity("streamed probe")
+        assert await stream.__anext__()
+        # 첫 조각만 받고 소비자가 스트림을 닫음
+        await stream.aclose()
+
+    run(abandon_stream())
+
+    assert service.resilience_stats()["breaker"]["state"] == CircuitBreaker.HALF_OPEN
+    assert run(service.query_perplexity("next probe", max_retries=0))
+    assert service.resilience_stats()["breaker"]["state"] == CircuitBreaker.CLOSED
+
+
+def test_probe_in_flight_expires_after_reset_timeout():
+    breaker = CircuitBreaker(min_requests=2, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # 결과를 남기지 못한 탐색 요청은 reset_timeout 뒤에 대체됨
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_identical_streams_share_one_upstream_call(stub, make_service):
+    service = make_service()
+    stub.latency = 0.3
+    profile = (["cough"], "female", "30", "none")
+
+    async def consume(delay=0.0):
+        await asyncio.sleep(delay)
+        return [event async for event in service.stream_combined_recommendations(*profile)]
+
+    async def main():
+        streamed = await asyncio.gather(consume(), consume(0.05), consume(0.1))
+        # 스트림이 끝난 뒤의 일반 조회는 캐시에서 응답
+        cached = service.cached_recommendations(*profile)
+        return streamed, cached
+
+    streamed, cached = run(main())
+
+    assert stub.requests == 1
+    assert streamed[0] and streamed[0] == streamed[1] == streamed[2]
+    assert cached is not None
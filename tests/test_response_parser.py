@@ -0,0 +1,80 @@
+"""
+api.response_parser against the frozen original parser over the corpus.
+
+The benchmark tests need pytest-benchmark (requirements-dev.txt) and are
+skipped without it. Each corpus variant is one benchmark group, so the
+two implementations are compared side by side:
+
+    python -m pytest tests/test_response_parser.py -k speed --benchmark-columns=mean,stddev
+"""
+import os
+import json
+import logging
+import importlib.util
+
+import pytest
+
+from api.response_parser import RecommendationParser, collect, parse_combined_response
+from benchmarks.legacy_parser import LegacyParser
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks", "corpus", "responses.json")
+
+with open(CORPUS_PATH, encoding="utf-8") as f:
+    CORPUS = json.load(f)
+
+CASES = [pytest.param(case, id=case["name"]) for case in CORPUS]
+SPLITTABLE = [pytest.param(case, id=case["name"]) for case in CORPUS if case["text"].count("MANAGEMENT:") == 1]
+
+PARSERS = {
+    "legacy": LegacyParser()._parse_combined_response,
+    "single_pass": parse_combined_response,
+}
+
+benchmark_installed = importlib.util.find_spec("pytest_benchmark") is not None
+
+
+@pytest.fixture(autouse=True)
+def quiet_parsers():
+    # 로그 호출 비용은 제외하고 파싱만 측정
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_matches_legacy_parser(case):
+    expected = PARSERS["legacy"](case["text"])
+    actual = parse_combined_response(case["text"])
+    if "legacy_differs" in case:
+        assert actual != expected, "documented difference no longer reproduces; drop legacy_differs"
+    else:
+        assert actual == expected
+
+
+def test_blank_lines_between_items_keeps_every_item():
+    case = next(case for case in CORPUS if case["name"] == "blank_lines_between_items")
+    medications, management_lists = parse_combined_response(case["text"])
+    assert len(management_lists["to_do_list"]) > 1
+    assert len(management_lists["do_not_list"]) > 1
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+@pytest.mark.parametrize("case", SPLITTABLE)
+def test_streamed_chunks_match_whole_response(case, chunk_size):
+    text = case["text"]
+    parser = RecommendationParser(RecommendationParser.MEDICATIONS)
+    events = []
+    for start in range(0, len(text), chunk_size):
+        events.extend(parser.feed(text[start:start + chunk_size]))
+    events.extend(parser.close())
+    assert collect(events) == parse_combined_response(text)
+
+
+@pytest.mark.skipif(not benchmark_installed, reason="pytest-benchmark is not installed")
+@pytest.mark.parametrize("implementation", sorted(PARSERS))
+@pytest.mark.parametrize("case", CASES)
+def test_parse_speed(benchmark, case, implementation):
+    benchmark.group = case["name"]
+    result = benchmark(PARSERS[implementation], case["text"])
+    if "legacy_differs" not in case:
+        assert result == PARSERS["legacy"](case["text"])